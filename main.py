@@ -5,15 +5,24 @@ Features: Pre-Start Menu, Free vs Paid Flow, Auto Admin from Environment
 
 import os
 import re
+import html
 import sqlite3
 import logging
 import hashlib
 import asyncio
-from datetime import datetime
+import functools
+import queue
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from io import BytesIO
-from typing import Optional, Tuple, List
+from typing import Any, Optional, Tuple, List, Dict, Iterator
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember
+import httpx
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember, MessageEntity
+from telegram.constants import ParseMode
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -23,15 +32,26 @@ from telegram.ext import (
     filters,
     ConversationHandler
 )
-from telegram.error import TelegramError
+from telegram.error import TelegramError, RetryAfter, Forbidden, NetworkError
+from telegram.request import HTTPXRequest
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
     import pytesseract
 except ImportError:
     print("PIL and pytesseract required. Install via requirements.txt")
     exit(1)
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
 # Enable logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -49,10 +69,89 @@ NAGAD_NUMBER = os.getenv('NAGAD_NUMBER', '01XXXXXXXXX')
 PRODUCT_PRICE = 50
 REFERRAL_THRESHOLD = 20
 DATABASE_PATH = 'netflix_bot.db'
+DB_CACHED_STATEMENTS = 512
+DB_POOL_SIZE = 8
+DB_BUSY_TIMEOUT_MS = 30000
+DB_LOCK_RETRIES = 5
+DB_MMAP_SIZE = 256 * 1024 * 1024
+BROADCAST_CONCURRENCY = 25
+BROADCAST_PAGE_SIZE = 500
+SEND_RATE_PER_SECOND = 25
+SEND_MAX_RETRIES = 3
+SEND_RETRY_DELAY = 1.0
+CHAT_SEND_INTERVAL = 1.0
+ADMIN_VIEW_CACHE_TTL = 10
+MEMBERSHIP_CACHE_TTL = 60
+OCR_WORKERS = os.cpu_count() or 1
+OCR_MAX_SIDE = 1024
+MAX_CHAT_ID = 2 ** 53
+# Chat ids as typed by people: optional minus sign, ASCII digits only (str.isdigit also accepts '²')
+CHAT_ID_PATTERN = re.compile(r'-?[0-9]+')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+ADMIN_LIST_LIMIT = 50
+PAYMENT_BATCH_SIZE = 100
+PROFILE_INSERT_CHUNK = 150
+FLAG_BATCH_SIZE = 500
+PAYMENT_BATCH_WINDOW = 0.1
+HTTP_POOL_SIZE = 512
+HTTP_POOL_TIMEOUT = 20
+
+# Webhook mode: Telegram pushes updates to WEBHOOK_URL instead of being long-polled
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')
+# Telegram echoes this in a header on every webhook call; without one anybody who finds
+# the URL could post forged updates, so fall back to a fresh random secret per start
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+DEFAULT_PORT = 8443
+PORT = os.getenv('PORT', '').strip()
+if PORT.isascii() and PORT.isdigit() and 0 < int(PORT) < 65536:
+    PORT = int(PORT)
+else:
+    if PORT:
+        logger.warning(f"Ignoring invalid PORT {PORT!r}; listening on {DEFAULT_PORT}")
+    PORT = DEFAULT_PORT
+# Only the update kinds we have handlers for; Telegram doesn't send the rest at all
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
 
 # Admin configuration from environment
 ADMIN_USER_IDS = os.getenv('ADMIN_USER_IDS', '')
-ADMIN_LIST = []
+# Optional chat that receives each payment screenshot once; admins get server-side copies
+ADMIN_LOG_CHAT_ID = os.getenv('ADMIN_LOG_CHAT_ID', '').strip()
+if CHAT_ID_PATTERN.fullmatch(ADMIN_LOG_CHAT_ID):
+    ADMIN_LOG_CHAT_ID = int(ADMIN_LOG_CHAT_ID)
+else:
+    if ADMIN_LOG_CHAT_ID:
+        logger.warning(f"Ignoring invalid ADMIN_LOG_CHAT_ID {ADMIN_LOG_CHAT_ID!r}; sending screenshots to admins directly")
+    ADMIN_LOG_CHAT_ID = None
+# Immutable so handlers can iterate it while load_admins_from_env swaps in a new one
+ADMIN_SET: frozenset = frozenset()
+
+# user_id -> user_type for registered users, so repeat /start skips the DB
+USER_TYPE_CACHE: Dict[int, str] = {}
+
+# Users flagged blocked_bot during this run, so /start can clear the flag without a lookup
+BLOCKED_USER_IDS: set = set()
+
+# Strong refs to fire-and-forget tasks so they aren't garbage collected mid-flight
+BACKGROUND_TASKS: set = set()
+
+# user_id -> time a channel membership check last succeeded; only positives are
+# cached so someone who has just joined is re-checked on their next tap
+MEMBERSHIP_CACHE: Dict[int, float] = {}
+
+# (row, future) pairs waiting for payment_writer to commit them in one transaction
+PAYMENT_WRITE_QUEUE: asyncio.Queue = asyncio.Queue()
+
+# (blocked, user_id) flag updates that nobody waits on, written behind by flag_writer
+FLAG_WRITE_QUEUE: asyncio.Queue = asyncio.Queue()
+
+# The two writer tasks, and whether they still take work; stop_writers flips this on
+# shutdown, after which writes go straight to the database
+WRITER_TASKS: List[asyncio.Task] = []
+WRITE_QUEUES_OPEN = True
+
+# view key -> (loaded_at, rows) for admin read-only screens and the stock check;
+# cleared whenever payments or profiles change
+ADMIN_VIEW_CACHE: Dict[str, Tuple[float, Any]] = {}
 
 # Conversation states
 WAITING_PAYMENT_SCREENSHOT = 1
@@ -67,11 +166,506 @@ VPN_INDICATORS = [
     'vpn', 'proxy', 'anonymous', 'hide', 'tunnel', 'secure',
     'private', 'shield', 'guard', 'protect'
 ]
+# Zero-width lookahead so overlapping indicators (e.g. "protectunnel") are all found
+VPN_INDICATOR_PATTERN = re.compile('(?=(' + '|'.join(map(re.escape, VPN_INDICATORS)) + '))')
+
+# OCR rules for payment screenshots, in priority order. Each rule is searched on
+# its own: as one alternation they consumed text and could swallow each other's
+# tokens (e.g. "BDT 9XY8ZW7VU6" lost the TrxID to the labelled-amount branch).
+OCR_TRX_PATTERNS = (
+    re.compile(r'(?:TrxID|Transaction ID|TXN ID|TXNID|TRX)\s*:?\s*([A-Z0-9]{10})', re.IGNORECASE),
+    re.compile(r'\b([A-Z0-9]{10})\b', re.IGNORECASE),
+)
+OCR_AMOUNT_PATTERNS = (
+    re.compile(r'(?:Amount|Total|Tk|BDT|৳)\s*:?\s*(\d+(?:\.\d{2})?)', re.IGNORECASE),
+    re.compile(r'(\d+(?:\.\d{2})?)\s*(?:Tk|BDT|৳|Taka)', re.IGNORECASE),
+    re.compile(rf'\b({PRODUCT_PRICE}(?:\.00)?)\b'),
+)
+
+# A real transaction id mixes letters and digits
+TRX_VALID_PATTERN = re.compile(r'[A-Z].*[0-9]|[0-9].*[A-Z]')
+# Payment buttons: action, optional rejection reason key, payment id (e.g. 'reject_reason_amount_42')
+PAYMENT_CALLBACK_PATTERN = re.compile(r'(approve_payment|reject_payment|reject_reason)_(?:([a-z]+)_)?(\d+)')
+
+# Static keyboards, built once and reused for every message
+PRESTART_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🎁 Get Netflix for FREE", callback_data='choose_free')],
+    [InlineKeyboardButton("💳 Buy Netflix (50 BDT)", callback_data='choose_paid')]
+])
+
+JOIN_CHANNEL_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📢 Join Our Channel", url=CHANNEL_LINK)],
+    [InlineKeyboardButton("✅ I Joined - Get Referral Link", callback_data='verify_and_get_link')]
+])
+
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🎁 My Referral Link", callback_data='verify_and_get_link')],
+    [InlineKeyboardButton("💳 Buy Netflix", callback_data='choose_paid')],
+    [InlineKeyboardButton("👨‍💼 Contact Admin", url=f'https://t.me/{OWNER_USERNAME[1:]}')]
+])
+
+ADMIN_PANEL_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("✅ Pending Payments", callback_data='admin_pending'),
+        InlineKeyboardButton("📊 Stats", callback_data='admin_stats')
+    ],
+    [
+        InlineKeyboardButton("➕ Add Profiles", callback_data='admin_add_profiles'),
+        InlineKeyboardButton("📦 Stock", callback_data='admin_stock')
+    ],
+    [
+        InlineKeyboardButton("📢 Broadcast", callback_data='admin_broadcast'),
+        InlineKeyboardButton("💬 Message User", callback_data='admin_message_user')
+    ],
+    [
+        InlineKeyboardButton("👥 Admins List", callback_data='admin_list'),
+        InlineKeyboardButton("🎁 Referrals", callback_data='admin_referrals')
+    ]
+])
+
+BACK_TO_START_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data='back_to_start')]])
+
+BACK_TO_ADMIN_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data='back_to_admin')]])
+
+# Sent with prebuilt entities instead of a parse_mode, so the text is never re-parsed.
+# Entity offsets count UTF-16 code units, and the emoji takes two
+ADMIN_PANEL_TEXT = "🔐 Admin Panel\n\nSelect an option:"
+ADMIN_PANEL_ENTITIES = (
+    MessageEntity(MessageEntity.BOLD, offset=len("🔐 ".encode('utf-16-le')) // 2, length=len("Admin Panel")),
+)
+
+# Menu texts with the config values folded in; only the first name is filled per message
+WELCOME_TEMPLATE = (
+    "👋 Welcome <b>{first_name}</b>!\n\n"
+    "🎬 <b>Netflix Profile Sales Bot</b>\n\n"
+    "Choose how you want to get Netflix:\n\n"
+    "🎁 <b>Get FREE Netflix</b>\n"
+    "• Join our channel\n"
+    "• Share referral link with friends\n"
+    "• 20 referrals = 1 FREE Netflix profile!\n\n"
+    "💳 <b>Buy Netflix Instantly</b>\n"
+    f"• Pay only {PRODUCT_PRICE} BDT\n"
+    "• No channel join required\n"
+    "• Get profile within 24 hours\n\n"
+    "📋 <b>Choose your option:</b>"
+)
+
+APPROVED_TEMPLATE = (
+    "✅ <b>Payment Approved!</b>\n\n"
+    "🎬 <b>Your Netflix Profile:</b>\n\n"
+    "📧 <b>Email:</b> <code>%(email)s</code>\n"
+    "🔑 <b>Password:</b> <code>%(password)s</code>\n"
+    "📍 <b>Profile PIN:</b> <code>%(pin)s</code>\n\n"
+    "⏱ <b>Valid for:</b> 1 Month\n"
+    "💳 <b>Payment ID:</b> <code>%(payment_id)s</code>\n\n"
+    "⚠️ <b>Important Notes:</b>\n"
+    "• Do NOT change the password\n"
+    "• Use only your assigned profile\n"
+    "• Save these credentials securely\n\n"
+    "✨ Enjoy your Netflix! 🍿\n\n"
+    "💡 <b>Bonus:</b> Share your referral link to earn more FREE profiles!"
+)
+
+WELCOME_BACK_TEMPLATE = (
+    "👋 Welcome back <b>{first_name}</b>!\n\n"
+    "🎬 <b>Netflix Profile Sales Bot</b>\n\n"
+    "📋 <b>Quick Access:</b>"
+)
+
+
+# (label, callback prefix) per rejection reason; only the payment id varies per keyboard
+_REJECT_REASON_ROWS = (
+    ("Invalid Screenshot", 'reject_reason_invalid_'),
+    ("Wrong Amount", 'reject_reason_amount_'),
+    ("Duplicate Transaction", 'reject_reason_duplicate_'),
+    ("Unclear Screenshot", 'reject_reason_unclear_'),
+)
+# Rejection reason key (from the callback data) -> text shown to the user
+_REASON_MAP = {
+    'invalid': 'Invalid or fake screenshot',
+    'amount': 'Wrong amount paid',
+    'duplicate': 'Duplicate transaction',
+    'unclear': 'Screenshot is unclear/unreadable'
+}
+_REJECT_CANCEL_ROW = (InlineKeyboardButton("🔙 Cancel", callback_data='back_to_admin'),)
+
+
+def rejection_reasons_markup(payment_id: int) -> InlineKeyboardMarkup:
+    """Rejection reason picker for one payment"""
+    rows = [(InlineKeyboardButton(label, callback_data=f'{prefix}{payment_id}'),) for label, prefix in _REJECT_REASON_ROWS]
+    rows.append(_REJECT_CANCEL_ROW)
+    return InlineKeyboardMarkup(rows)
+
+# Hot-path SQL kept as constants so every call hits the connection's statement cache
+SQL_GET_USER_TYPE = "SELECT user_type, blocked_bot FROM users WHERE user_id = ?"
+SQL_GET_ALL_USER_STATES = "SELECT user_id, user_type, blocked_bot FROM users"
+SQL_INSERT_USER = """INSERT INTO users (user_id, username, first_name, referral_code, referred_by, 
+    ip_hash, is_vpn_user, user_type) 
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?) 
+    ON CONFLICT(user_id) DO NOTHING 
+    RETURNING user_id"""
+SQL_SET_USER_BLOCKED = "UPDATE users SET blocked_bot = ? WHERE user_id = ?"
+SQL_GET_REFERRER_CHECK = """SELECT ip_hash, referral_count, free_profiles_earned, 
+    EXISTS(SELECT 1 FROM users WHERE referred_by = ? AND ip_hash = ?) 
+    FROM users WHERE user_id = ?"""
+SQL_CREDIT_REFERRER = """UPDATE users SET referral_count = referral_count + 1, 
+    free_profiles_earned = MAX(free_profiles_earned, (referral_count + 1) / ?) 
+    WHERE user_id = ?"""
+SQL_GET_REFERRAL_STATS = "SELECT referral_code, referral_count, free_profiles_earned FROM users WHERE user_id = ?"
+SQL_GET_JOINED_STATS = (
+    "SELECT channel_joined, referral_code, referral_count, free_profiles_earned FROM users WHERE user_id = ?"
+)
+SQL_MARK_CHANNEL_JOINED = """UPDATE users SET channel_joined = 1 WHERE user_id = ? 
+    RETURNING referral_code, referral_count, free_profiles_earned"""
+SQL_COUNT_PROFILE_STOCK = """SELECT
+    (SELECT v FROM meta WHERE k = 'unsold'),
+    (SELECT v FROM meta WHERE k = 'sold')"""
+SQL_ADMIN_STATS = """SELECT
+    (SELECT COUNT(*) FROM sales WHERE status = 'completed'),
+    (SELECT COALESCE(SUM(amount), 0) FROM sales WHERE status = 'completed'),
+    (SELECT COUNT(*) FROM users),
+    (SELECT COUNT(*) FROM users WHERE is_paid_user = 1),
+    (SELECT COUNT(*) FROM pending_payments WHERE status = 'pending')"""
+SQL_HAS_UNSOLD_PROFILE = "SELECT v > 0 FROM meta WHERE k = 'unsold'"
+SQL_GET_PENDING = """SELECT id, user_id, username, trxid, amount, submitted_at 
+    FROM pending_payments WHERE status = 'pending' 
+    ORDER BY submitted_at DESC LIMIT 10"""
+SQL_APPROVE_PAYMENT = """UPDATE pending_payments SET status = 'approved' 
+    WHERE id = ? AND status != 'approved' 
+    RETURNING user_id, username, trxid, amount"""
+SQL_CLAIM_PROFILE = """UPDATE profiles 
+    SET status = 'sold', sold_at = CURRENT_TIMESTAMP, sold_to_user_id = ? 
+    WHERE id = (SELECT id FROM profiles WHERE status = 'unsold' LIMIT 1) 
+    RETURNING id, email, password, profile_pin"""
+SQL_INSERT_SALE = """INSERT INTO sales (user_id, username, trxid, amount, profile_id, status) 
+    VALUES (?, ?, ?, ?, ?, 'completed')"""
+SQL_INSERT_PENDING = """INSERT INTO pending_payments (user_id, username, screenshot_file_id, trxid, amount) 
+    VALUES (?, ?, ?, ?, ?) RETURNING id"""
+SQL_MARK_USER_PAID = "UPDATE users SET is_paid_user = 1 WHERE user_id = ?"
+SQL_GET_PAYMENT_USER = "SELECT user_id FROM pending_payments WHERE id = ?"
+SQL_REJECT_PAYMENT = "UPDATE pending_payments SET status = 'rejected', rejection_reason = ? WHERE id = ?"
+SQL_SAVE_APPEAL = (
+    "UPDATE pending_payments SET appeal_message = ?, appeal_submitted_at = CURRENT_TIMESTAMP WHERE id = ?"
+)
+SQL_GET_USER_ID_PAGE = "SELECT user_id FROM users WHERE user_id > ? AND blocked_bot = 0 ORDER BY user_id LIMIT ?"
+SQL_TOP_REFERRERS = """SELECT first_name, username, referral_count, free_profiles_earned 
+    FROM users WHERE referral_count > 0 ORDER BY referral_count DESC LIMIT 10"""
+SQL_UPSERT_ENV_ADMIN = "INSERT OR REPLACE INTO admins (user_id, added_by) VALUES (?, 'environment')"
+SQL_GET_ADMIN_IDS = "SELECT user_id FROM admins"
+
+
+def get_db_connection(database: Optional[str] = None, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open a connection to the bot database"""
+    conn = sqlite3.connect(
+        database or DATABASE_PATH,
+        cached_statements=DB_CACHED_STATEMENTS,
+        check_same_thread=check_same_thread
+    )
+    # WAL (set once in init_database) makes NORMAL durable enough and lets readers run during writes
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    return conn
+
+
+class FastJSONRequest(HTTPXRequest):
+    """HTTPXRequest that decodes Telegram responses with msgspec when it's installed"""
+    
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> Dict[str, Any]:
+        if msgspec is None:
+            return HTTPXRequest.parse_json_payload(payload)
+        try:
+            return msgspec.json.decode(payload)
+        except msgspec.DecodeError as exc:
+            logger.error(f"Can not load invalid JSON data: {payload[:200]!r}")
+            raise TelegramError("Invalid server response") from exc
+
+
+class SQLiteConnectionPool:
+    """Pool of long-lived SQLite connections shared by all handlers"""
+    
+    def __init__(self, database: str, size: int = DB_POOL_SIZE):
+        self.database = database
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=size)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a pooled connection and apply per-connection settings once"""
+        conn = get_db_connection(self.database, check_same_thread=False)
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+        # Serve reads straight from the OS page cache instead of copying through read()
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        return conn
+    
+    @contextmanager
+    def acquire(self) -> Iterator[sqlite3.Connection]:
+        """Check out a connection, returning it to the pool afterwards"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        
+        try:
+            yield conn
+        finally:
+            # Never hand a half-finished transaction to the next user
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+DB_POOL: Optional[SQLiteConnectionPool] = None
+
+# Tesseract is CPU-bound, so OCR runs in worker processes instead of on the event loop
+OCR_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _run_with_pool(fn, *args):
+    """Run fn(conn, *args) on a pooled connection"""
+    with DB_POOL.acquire() as conn:
+        return fn(conn, *args)
+
+
+async def db_exec(fn, *args):
+    """Run a blocking database callable in a worker thread, off the event loop"""
+    return await asyncio.to_thread(_run_with_pool, fn, *args)
+
+
+def retry_on_locked(fn):
+    """Retry a write fn(conn, ...) with exponential backoff while the database is locked"""
+    @functools.wraps(fn)
+    def wrapper(conn: sqlite3.Connection, *args):
+        for attempt in range(DB_LOCK_RETRIES + 1):
+            try:
+                return fn(conn, *args)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == DB_LOCK_RETRIES:
+                    raise
+                # Start the retry from a clean transaction so nothing is applied twice
+                if conn.in_transaction:
+                    conn.rollback()
+                logger.warning(f"Database locked in {fn.__name__}, retry {attempt + 1}/{DB_LOCK_RETRIES}")
+                time.sleep(0.05 * 2 ** attempt)
+    return wrapper
+
+
+class TokenBucket:
+    """Async token bucket keeping outbound sends under Telegram's flood limits"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a send is allowed and take one token"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+    
+    def pause(self, seconds: float):
+        """Hold every sender back for the given number of seconds"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+SEND_LIMITER = TokenBucket(SEND_RATE_PER_SECOND)
+
+# chat_id -> earliest monotonic time the next safe_send to that chat may start
+CHAT_NEXT_SEND: Dict[int, float] = {}
+
+
+async def wait_chat_slot(chat_id: int):
+    """Space sends to one chat CHAT_SEND_INTERVAL apart, reserving the slot before sleeping"""
+    now = time.monotonic()
+    slot = max(now, CHAT_NEXT_SEND.get(chat_id, 0.0))
+    CHAT_NEXT_SEND[chat_id] = slot + CHAT_SEND_INTERVAL
+    
+    # Broadcasts touch every user; forget chats whose slot has already passed
+    if len(CHAT_NEXT_SEND) > 10000:
+        for stale in [cid for cid, t in CHAT_NEXT_SEND.items() if t <= now]:
+            del CHAT_NEXT_SEND[stale]
+    
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+
+async def cached(key: str, ttl: float, loader) -> Any:
+    """Return ADMIN_VIEW_CACHE[key] if fresher than ttl, else await loader() and store it"""
+    now = time.monotonic()
+    entry = ADMIN_VIEW_CACHE.get(key)
+    if entry and now - entry[0] < ttl:
+        return entry[1]
+    
+    value = await loader()
+    ADMIN_VIEW_CACHE[key] = (now, value)
+    return value
+
+
+def invalidate_admin_views():
+    """Drop cached admin screens after a write to payments or profiles"""
+    ADMIN_VIEW_CACHE.clear()
+
+
+@retry_on_locked
+def _set_users_blocked(conn: sqlite3.Connection, updates: List[Tuple[bool, int]]):
+    """Flag or unflag users who blocked the bot, in one transaction"""
+    cursor = conn.cursor()
+    cursor.executemany(SQL_SET_USER_BLOCKED, updates)
+    conn.commit()
+
+
+def set_user_blocked(user_id: int, blocked: bool):
+    """Queue a blocked_bot flag change; the reply or broadcast doesn't wait for the write"""
+    if WRITE_QUEUES_OPEN:
+        FLAG_WRITE_QUEUE.put_nowait((blocked, user_id))
+    else:
+        run_in_background(db_exec(_set_users_blocked, [(blocked, user_id)]))
+
+
+async def flag_writer():
+    """Drain FLAG_WRITE_QUEUE, committing whatever has piled up as one batch, until a None"""
+    stopping = False
+    while not stopping:
+        update = await FLAG_WRITE_QUEUE.get()
+        if update is None:
+            break
+        batch = [update]
+        while len(batch) < FLAG_BATCH_SIZE and not FLAG_WRITE_QUEUE.empty():
+            update = FLAG_WRITE_QUEUE.get_nowait()
+            if update is None:
+                stopping = True
+                break
+            batch.append(update)
+        
+        try:
+            await db_exec(_set_users_blocked, batch)
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} blocked flags: {e}")
+
+
+async def stop_writers():
+    """Stop queueing writes and wait until both writers have committed everything queued"""
+    global WRITE_QUEUES_OPEN
+    WRITE_QUEUES_OPEN = False
+    # None sorts after everything already queued, so each writer flushes its backlog first
+    PAYMENT_WRITE_QUEUE.put_nowait(None)
+    FLAG_WRITE_QUEUE.put_nowait(None)
+    await asyncio.gather(*WRITER_TASKS, return_exceptions=True)
+
+
+def request_never_sent(error: NetworkError) -> bool:
+    """Whether a failed Bot API call provably never reached Telegram (no connection or pool slot)"""
+    return isinstance(error.__cause__, (httpx.ConnectError, httpx.PoolTimeout))
+
+
+async def safe_send(coro_factory, chat_id: int):
+    """Rate-limited (bot-wide and per chat) Telegram call that retries RetryAfter and unsent requests"""
+    for attempt in range(SEND_MAX_RETRIES + 1):
+        await wait_chat_slot(chat_id)
+        await SEND_LIMITER.acquire()
+        try:
+            return await coro_factory()
+        except Forbidden:
+            # Bot was blocked; skip this chat in future broadcasts
+            BLOCKED_USER_IDS.add(chat_id)
+            set_user_blocked(chat_id, True)
+            raise
+        except RetryAfter as e:
+            if attempt == SEND_MAX_RETRIES:
+                raise
+            logger.warning(f"Flood control for {chat_id}, retrying in {e.retry_after}s")
+            SEND_LIMITER.pause(e.retry_after)
+        except NetworkError as e:
+            # Sends aren't idempotent: a timeout or dropped connection may come after
+            # Telegram already delivered the message, so only resend what never left
+            if attempt == SEND_MAX_RETRIES or not request_never_sent(e):
+                raise
+            logger.warning(f"Could not reach Telegram for {chat_id}, retrying: {e}")
+            await asyncio.sleep(SEND_RETRY_DELAY * (attempt + 1))
+
+
+def _log_task_failure(task: asyncio.Task):
+    """Log the exception of a background task nobody awaits"""
+    if not task.cancelled() and task.exception():
+        logger.error(f"Background task {task.get_coro().__qualname__} failed: {task.exception()!r}")
+
+
+def run_in_background(coro) -> asyncio.Task:
+    """Schedule a coroutine without awaiting it, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    task.add_done_callback(_log_task_failure)
+    return task
+
+
+async def notify_admins(bot, text: str, photo: Optional[str] = None, **kwargs):
+    """Send the same message (or photo with caption) to every admin concurrently, logging failures"""
+    source = None
+    if photo and ADMIN_LOG_CHAT_ID:
+        # Upload once to the log chat, then copy that message to each admin
+        try:
+            source = await safe_send(
+                functools.partial(bot.send_photo, chat_id=ADMIN_LOG_CHAT_ID, photo=photo, caption=text, **kwargs),
+                ADMIN_LOG_CHAT_ID
+            )
+        except TelegramError as e:
+            logger.error(f"Failed to post to admin log chat {ADMIN_LOG_CHAT_ID}: {e}")
+    
+    def send(admin_id: int):
+        if source:
+            return bot.copy_message(
+                chat_id=admin_id, from_chat_id=ADMIN_LOG_CHAT_ID, message_id=source.message_id,
+                reply_markup=kwargs.get('reply_markup')
+            )
+        if photo:
+            return bot.send_photo(chat_id=admin_id, photo=photo, caption=text, **kwargs)
+        return bot.send_message(chat_id=admin_id, text=text, **kwargs)
+    
+    admin_ids = ADMIN_SET
+    results = await asyncio.gather(
+        *(safe_send(functools.partial(send, admin_id), admin_id) for admin_id in admin_ids),
+        return_exceptions=True
+    )
+    for admin_id, result in zip(admin_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to notify admin {admin_id}: {result}")
+
 
 # Database initialization
 def init_database():
     """Initialize SQLite database with all required tables"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = get_db_connection()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
     cursor = conn.cursor()
     
     # Profiles table
@@ -112,16 +706,22 @@ def init_database():
             referred_by INTEGER,
             referral_count INTEGER DEFAULT 0,
             free_profiles_earned INTEGER DEFAULT 0,
-            ip_hash TEXT,
+            ip_hash BLOB,
             is_vpn_user BOOLEAN DEFAULT 0,
             channel_joined BOOLEAN DEFAULT 0,
             is_paid_user BOOLEAN DEFAULT 0,
             user_type TEXT DEFAULT 'unknown',
+            blocked_bot BOOLEAN DEFAULT 0,
             joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (referred_by) REFERENCES users(user_id)
         )
     ''')
     
+    # Databases created before blocked_bot existed
+    cursor.execute("PRAGMA table_info(users)")
+    if 'blocked_bot' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE users ADD COLUMN blocked_bot BOOLEAN DEFAULT 0")
+    
     # Pending payments table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS pending_payments (
@@ -150,102 +750,182 @@ def init_database():
         )
     ''')
     
+    # Maintained counters (stock per profile status) so stock checks are a single-row read
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            k TEXT PRIMARY KEY,
+            v INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute(
+        """INSERT OR IGNORE INTO meta (k, v) VALUES 
+           ('unsold', (SELECT COUNT(*) FROM profiles WHERE status = 'unsold')), 
+           ('sold', (SELECT COUNT(*) FROM profiles WHERE status = 'sold'))"""
+    )
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_profiles_insert AFTER INSERT ON profiles
+        BEGIN
+            UPDATE meta SET v = v + 1 WHERE k = NEW.status;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_profiles_status AFTER UPDATE OF status ON profiles
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE meta SET v = v - 1 WHERE k = OLD.status;
+            UPDATE meta SET v = v + 1 WHERE k = NEW.status;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_profiles_delete AFTER DELETE ON profiles
+        BEGIN
+            UPDATE meta SET v = v - 1 WHERE k = OLD.status;
+        END
+    ''')
+    
+    # Indexes for hot WHERE clauses
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_ref_ip ON users(referred_by, ip_hash)")
+    # Only unsold profiles are ever looked up by status; the meta counters cover the counts
+    cursor.execute("DROP INDEX IF EXISTS idx_profiles_status")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profiles_unsold ON profiles(id) WHERE status = 'unsold'")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_pending_user ON pending_payments(user_id, status)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pending_status_submitted ON pending_payments(status, submitted_at DESC)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_paid ON users(is_paid_user) WHERE is_paid_user = 1")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_referrals ON users(referral_count DESC) WHERE referral_count > 0"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_user ON sales(user_id)")
+    # One Netflix login carries several profiles, so an upload is a duplicate only if the PIN matches too
+    try:
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_profiles_email_pin ON profiles(email, profile_pin)")
+    except sqlite3.IntegrityError:
+        logger.warning("Duplicate profiles already stored; bulk uploads won't skip repeats until they're removed")
+    # Covers the completed-sales count and revenue sum on the stats screen
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_status_amount ON sales(status, amount)")
+    
+    # Refresh planner statistics so the indexes above are actually chosen
+    cursor.execute("ANALYZE")
+    
     conn.commit()
     conn.close()
     logger.info("Database initialized successfully")
 
 
+def _sync_admins(conn: sqlite3.Connection, env_admins: List[int]) -> List[int]:
+    """Store environment admins and return every admin id in the database"""
+    cursor = conn.cursor()
+    
+    try:
+        cursor.executemany(
+            SQL_UPSERT_ENV_ADMIN,
+            [(admin_id,) for admin_id in set(env_admins)]
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Error adding admins {env_admins}: {e}")
+    
+    cursor.execute(SQL_GET_ADMIN_IDS)
+    return [row[0] for row in cursor.fetchall()]
+
+
+async def warm_user_caches():
+    """Preload user types and blocked flags so returning users' /start never hits the DB"""
+    for user_id, user_type, blocked in await db_exec(_fetch_all_user_states):
+        USER_TYPE_CACHE[user_id] = user_type
+        if blocked:
+            BLOCKED_USER_IDS.add(user_id)
+    logger.info(f"👥 Cached {len(USER_TYPE_CACHE)} known user(s)")
+
+
 async def load_admins_from_env():
     """Load admins from environment variable and database"""
-    global ADMIN_LIST
+    global ADMIN_SET
+    
+    env_admins = []
     
     # Load from environment variable
     if ADMIN_USER_IDS:
         env_admins = [int(x.strip()) for x in ADMIN_USER_IDS.split(',') if x.strip().isdigit()]
-        
-        # Add to database
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        for admin_id in env_admins:
-            try:
-                cursor.execute(
-                    "INSERT OR REPLACE INTO admins (user_id, added_by) VALUES (?, 'environment')",
-                    (admin_id,)
-                )
-            except Exception as e:
-                logger.error(f"Error adding admin {admin_id}: {e}")
-        
-        conn.commit()
-        conn.close()
-        
-        ADMIN_LIST.extend(env_admins)
     
-    # Load from database
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT user_id FROM admins")
-    db_admins = [row[0] for row in cursor.fetchall()]
-    conn.close()
+    # Add to database, then load from database
+    db_admins = await db_exec(_sync_admins, env_admins)
     
     # Merge and deduplicate
-    ADMIN_LIST = list(set(ADMIN_LIST + db_admins))
+    ADMIN_SET = frozenset(env_admins) | frozenset(db_admins)
     
-    if ADMIN_LIST:
-        logger.info(f"✅ Loaded {len(ADMIN_LIST)} admin(s): {ADMIN_LIST}")
+    if ADMIN_SET:
+        logger.info(f"✅ Loaded {len(ADMIN_SET)} admin(s): {sorted(ADMIN_SET)}")
     else:
         logger.warning("⚠️ No admins configured. Set ADMIN_USER_IDS environment variable.")
 
 
 def is_admin(user_id: int) -> bool:
     """Check if user is admin"""
-    return user_id in ADMIN_LIST
+    return user_id in ADMIN_SET
+
+
+def channel_handle() -> str:
+    """CHANNEL_USERNAME as an @handle"""
+    return CHANNEL_USERNAME if CHANNEL_USERNAME.startswith('@') else '@' + CHANNEL_USERNAME
+
+
+async def resolve_channel_id(application: Application):
+    """Look up the channel's numeric id once so membership checks skip username resolution"""
+    try:
+        chat = await application.bot.get_chat(channel_handle())
+        application.bot_data['channel_id'] = chat.id
+        logger.info(f"📢 Channel {channel_handle()} resolved to {chat.id}")
+    except TelegramError as e:
+        logger.error(f"Could not resolve channel {channel_handle()}: {e}")
 
 
 async def check_channel_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if user has joined the required channel"""
+    checked_at = MEMBERSHIP_CACHE.get(user_id)
+    if checked_at is not None and time.monotonic() - checked_at < MEMBERSHIP_CACHE_TTL:
+        return True
+    
     try:
-        channel = CHANNEL_USERNAME
-        if not channel.startswith('@'):
-            channel = '@' + channel
-        
+        # Numeric id resolved in post_init; the @username is only a fallback
+        channel = context.bot_data.get('channel_id') or channel_handle()
         member = await context.bot.get_chat_member(chat_id=channel, user_id=user_id)
         
         if member.status in [ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
+            MEMBERSHIP_CACHE[user_id] = time.monotonic()
             return True
+        MEMBERSHIP_CACHE.pop(user_id, None)
         return False
     except Exception as e:
         logger.error(f"Channel check error for user {user_id}: {e}")
         return False
 
 
-def get_user_ip_hash(update: Update) -> Optional[str]:
+def get_user_ip_hash(update: Update) -> Optional[bytes]:
     """Generate a hash from user info to track unique devices"""
     try:
         user = update.effective_user
         data = f"{user.id}_{user.username}_{user.first_name}_{user.language_code}"
-        return hashlib.sha256(data.encode()).hexdigest()
+        return hashlib.blake2b(data.encode(), digest_size=16).digest()
     except:
         return None
 
 
-def detect_vpn(update: Update, user_ip_hash: str) -> bool:
+def detect_vpn(update: Update, user_ip_hash: Optional[bytes]) -> bool:
     """Detect potential VPN usage (simplified)"""
     try:
         user = update.effective_user
-        suspicious_indicators = 0
+        if not (user.username or user.first_name):
+            return False
         
-        if user.username:
-            username_lower = user.username.lower()
-            for indicator in VPN_INDICATORS:
-                if indicator in username_lower:
-                    suspicious_indicators += 1
+        suspicious_indicators = 0
         
-        if user.first_name:
-            name_lower = user.first_name.lower()
-            for indicator in VPN_INDICATORS:
-                if indicator in name_lower:
-                    suspicious_indicators += 1
+        # Count each distinct indicator once per field, as the substring checks did
+        for field in (user.username, user.first_name):
+            if field:
+                suspicious_indicators += len(set(VPN_INDICATOR_PATTERN.findall(field.lower())))
         
         return suspicious_indicators >= 2
         
@@ -253,75 +933,170 @@ def detect_vpn(update: Update, user_ip_hash: str) -> bool:
         return False
 
 
+def parse_callback_id(data: str) -> Optional[int]:
+    """Trailing numeric id of callback data like 'approve_payment_42', or None"""
+    tail = data.rsplit('_', 1)[-1]
+    return int(tail) if tail.isascii() and tail.isdigit() else None
+
+
 def generate_referral_code(user_id: int) -> str:
     """Generate unique referral code for user"""
     return f"REF{user_id}"
 
 
-def register_user(user_id: int, username: str, first_name: str, user_type: str = 'unknown',
-                 referred_by: Optional[int] = None, ip_hash: Optional[str] = None, is_vpn: bool = False):
+@retry_on_locked
+def register_user(conn: sqlite3.Connection, user_id: int, username: str, first_name: str,
+                  user_type: str = 'unknown', referred_by: Optional[int] = None,
+                  ip_hash: Optional[bytes] = None, is_vpn: bool = False) -> Tuple[bool, int]:
     """Register or update user in database"""
-    conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     
-    # Check if user exists
-    cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
-    exists = cursor.fetchone()
+    # Take the write lock up front so the whole registration commits once
+    cursor.execute("BEGIN IMMEDIATE")
     
-    if not exists:
-        referral_code = generate_referral_code(user_id)
-        
-        # Validate referral
-        valid_referral = False
-        if referred_by:
-            cursor.execute("SELECT user_id, ip_hash, is_vpn_user FROM users WHERE user_id = ?", (referred_by,))
-            referrer = cursor.fetchone()
-            
-            if referrer and ip_hash:
-                referrer_ip = referrer[1]
-                
-                cursor.execute(
-                    "SELECT COUNT(*) FROM users WHERE referred_by = ? AND ip_hash = ?",
-                    (referred_by, ip_hash)
-                )
-                same_ip_count = cursor.fetchone()[0]
-                
-                if same_ip_count == 0 and ip_hash != referrer_ip and not is_vpn:
-                    valid_referral = True
-        
-        cursor.execute(
-            """INSERT INTO users (user_id, username, first_name, referral_code, referred_by, 
-               ip_hash, is_vpn_user, user_type) 
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (user_id, username, first_name, referral_code, 
-             referred_by if valid_referral else None, ip_hash, is_vpn, user_type)
-        )
-        
-        # Update referrer's count if valid
-        if valid_referral:
-            cursor.execute(
-                "UPDATE users SET referral_count = referral_count + 1 WHERE user_id = ?",
-                (referred_by,)
-            )
-            
-            cursor.execute("SELECT referral_count, free_profiles_earned FROM users WHERE user_id = ?", (referred_by,))
-            ref_data = cursor.fetchone()
-            if ref_data:
-                referrals, free_earned = ref_data
-                new_free_profiles = referrals // REFERRAL_THRESHOLD - free_earned
-                
-                if new_free_profiles > 0:
-                    cursor.execute(
-                        "UPDATE users SET free_profiles_earned = free_profiles_earned + ? WHERE user_id = ?",
-                        (new_free_profiles, referred_by)
-                    )
-                    conn.commit()
-                    conn.close()
-                    return True, new_free_profiles
+    referral_code = generate_referral_code(user_id)
+    
+    # Validate referral
+    valid_referral = False
+    referrer = None
+    if referred_by and ip_hash:
+        # Referrer lookup, counters and same-device check in one statement
+        cursor.execute(SQL_GET_REFERRER_CHECK, (referred_by, ip_hash, referred_by))
+        referrer = cursor.fetchone()
+        
+        if referrer:
+            referrer_ip, _, _, same_ip_exists = referrer
+            if not same_ip_exists and ip_hash != referrer_ip and not is_vpn:
+                valid_referral = True
+    
+    # Insert only new users; RETURNING yields no row if the user already exists
+    cursor.execute(
+        SQL_INSERT_USER,
+        (user_id, username, first_name, referral_code, 
+         referred_by if valid_referral else None, ip_hash, is_vpn, user_type)
+    )
+    created = cursor.fetchone()
+    if created:
+        USER_TYPE_CACHE[user_id] = user_type
+    
+    # Update referrer's count and earned profiles in one statement if valid; the
+    # counters read above can't have moved since BEGIN IMMEDIATE holds the write lock
+    new_free_profiles = 0
+    if created and valid_referral:
+        _, referrals, free_earned, _ = referrer
+        new_free_profiles = max((referrals + 1) // REFERRAL_THRESHOLD - free_earned, 0)
+        cursor.execute(SQL_CREDIT_REFERRER, (REFERRAL_THRESHOLD, referred_by))
     
     conn.commit()
-    conn.close()
-    return False, 0
+    return new_free_profiles > 0, new_free_profiles
+
+
+# User-facing database operations, executed in worker threads via db_exec
+def _fetch_all_user_states(conn: sqlite3.Connection) -> List[tuple]:
+    """(user_id, user_type, blocked_bot) for every registered user"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_GET_ALL_USER_STATES)
+    return cursor.fetchall()
+
+
+def _get_user_state(conn: sqlite3.Connection, user_id: int) -> Optional[tuple]:
+    """(user_type, blocked_bot) for a registered user, or None"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_GET_USER_TYPE, (user_id,))
+    return cursor.fetchone()
+
+
+@retry_on_locked
+def _mark_channel_joined(conn: sqlite3.Connection, user_id: int) -> Optional[tuple]:
+    """Record that a user has joined the channel; returns their referral stats"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_MARK_CHANNEL_JOINED, (user_id,))
+    user_data = cursor.fetchone()
+    conn.commit()
+    return user_data
+
+
+def _fetch_referral_stats(conn: sqlite3.Connection, user_id: int) -> Optional[tuple]:
+    """(referral_code, referral_count, free_profiles_earned) for a user"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_GET_REFERRAL_STATS, (user_id,))
+    return cursor.fetchone()
+
+
+def _fetch_joined_stats(conn: sqlite3.Connection, user_id: int) -> Optional[tuple]:
+    """(channel_joined, referral_code, referral_count, free_profiles_earned) for a user"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_GET_JOINED_STATS, (user_id,))
+    return cursor.fetchone()
+
+
+def _has_unsold_profile(conn: sqlite3.Connection) -> bool:
+    """Whether any profile is in stock"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_HAS_UNSOLD_PROFILE)
+    return bool(cursor.fetchone()[0])
+
+
+@retry_on_locked
+def _submit_payments(conn: sqlite3.Connection, rows: List[tuple]) -> List[int]:
+    """Queue a batch of payment screenshots for review in one transaction; returns their ids"""
+    cursor = conn.cursor()
+    
+    payment_ids = [cursor.execute(SQL_INSERT_PENDING, row).fetchone()[0] for row in rows]
+    
+    # Mark users as paid users
+    cursor.executemany(SQL_MARK_USER_PAID, {(row[0],) for row in rows})
+    
+    conn.commit()
+    return payment_ids
+
+
+async def payment_writer():
+    """Drain PAYMENT_WRITE_QUEUE, committing submissions that arrive together as one batch, until a None"""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        item = await PAYMENT_WRITE_QUEUE.get()
+        if item is None:
+            break
+        batch = [item]
+        deadline = loop.time() + PAYMENT_BATCH_WINDOW
+        while len(batch) < PAYMENT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(PAYMENT_WRITE_QUEUE.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        
+        try:
+            payment_ids = await db_exec(_submit_payments, [row for row, _ in batch])
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} payments: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+        
+        for (_, future), payment_id in zip(batch, payment_ids):
+            if not future.done():
+                future.set_result(payment_id)
+
+
+async def submit_payment(user_id: int, username: Optional[str], file_id: str,
+                         trx_id: Optional[str], amount: Optional[int]) -> int:
+    """Hand a payment to payment_writer and wait for its id"""
+    row = (user_id, username, file_id, trx_id, amount)
+    if not WRITE_QUEUES_OPEN:
+        return (await db_exec(_submit_payments, [row]))[0]
+    future = asyncio.get_running_loop().create_future()
+    await PAYMENT_WRITE_QUEUE.put((row, future))
+    return await future
 
 
 class NetflixBot:
@@ -343,38 +1118,26 @@ class NetflixBot:
                     pass
         
         # If user already registered, show main menu
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_type FROM users WHERE user_id = ?", (user.id,))
-        existing = cursor.fetchone()
-        conn.close()
-        
-        if existing and existing[0] != 'unknown':
+        user_type = USER_TYPE_CACHE.get(user.id)
+        blocked = user.id in BLOCKED_USER_IDS
+        if user_type is None:
+            existing = await db_exec(_get_user_state, user.id)
+            if existing:
+                user_type, blocked = existing
+                USER_TYPE_CACHE[user.id] = user_type
+        
+        # A user talking to us again has unblocked the bot
+        if blocked:
+            BLOCKED_USER_IDS.discard(user.id)
+            set_user_blocked(user.id, False)
+        
+        if user_type and user_type != 'unknown':
             # User already chose path, show main menu
             await NetflixBot.show_main_menu(update, context)
             return
         
         # Show pre-start menu (choice between free and paid)
-        keyboard = [
-            [InlineKeyboardButton("🎁 Get Netflix for FREE", callback_data='choose_free')],
-            [InlineKeyboardButton("💳 Buy Netflix (50 BDT)", callback_data='choose_paid')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        welcome_message = (
-            f"👋 Welcome *{user.first_name}*!\n\n"
-            f"🎬 *Netflix Profile Sales Bot*\n\n"
-            f"Choose how you want to get Netflix:\n\n"
-            f"🎁 *Get FREE Netflix*\n"
-            f"• Join our channel\n"
-            f"• Share referral link with friends\n"
-            f"• 20 referrals = 1 FREE Netflix profile!\n\n"
-            f"💳 *Buy Netflix Instantly*\n"
-            f"• Pay only {PRODUCT_PRICE} BDT\n"
-            f"• No channel join required\n"
-            f"• Get profile within 24 hours\n\n"
-            f"📋 *Choose your option:*"
-        )
+        welcome_message = WELCOME_TEMPLATE.format(first_name=html.escape(user.first_name))
         
         # Store referral info in user data for later
         if referred_by:
@@ -382,8 +1145,8 @@ class NetflixBot:
         
         await update.message.reply_text(
             welcome_message,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+            parse_mode=ParseMode.HTML,
+            reply_markup=PRESTART_MARKUP
         )
     
     @staticmethod
@@ -400,19 +1163,19 @@ class NetflixBot:
         referred_by = context.user_data.get('referred_by')
         
         # Register user as free path
-        register_user(user.id, user.username, user.first_name, 'free', referred_by, ip_hash, is_vpn)
+        await db_exec(register_user, user.id, user.username, user.first_name, 'free', referred_by, ip_hash, is_vpn)
         
         # VPN warning
         if is_vpn:
             await query.edit_message_text(
-                "⚠️ *VPN/Proxy Detected*\n\n"
+                "⚠️ <b>VPN/Proxy Detected</b>\n\n"
                 "We detected you're using a VPN or proxy.\n\n"
-                "⚠️ *Important:*\n"
+                "⚠️ <b>Important:</b>\n"
                 "• You can still get FREE Netflix via referrals\n"
                 "• However, your referrals from VPN won't count\n"
                 "• Consider buying directly (50 BDT) instead\n\n"
                 "Proceeding to free path...",
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
             )
             await asyncio.sleep(3)
         
@@ -421,27 +1184,21 @@ class NetflixBot:
         
         if not channel_joined:
             # Show channel join requirement
-            keyboard = [
-                [InlineKeyboardButton("📢 Join Our Channel", url=CHANNEL_LINK)],
-                [InlineKeyboardButton("✅ I Joined - Get Referral Link", callback_data='verify_and_get_link')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await query.edit_message_text(
-                f"🎁 *Get Netflix for FREE!*\n\n"
-                f"📋 *Steps to get FREE Netflix:*\n\n"
+                f"🎁 <b>Get Netflix for FREE!</b>\n\n"
+                f"📋 <b>Steps to get FREE Netflix:</b>\n\n"
                 f"1️⃣ Join our channel (required)\n"
                 f"2️⃣ Get your unique referral link\n"
                 f"3️⃣ Share with 20 friends\n"
                 f"4️⃣ Get 1 FREE Netflix profile!\n\n"
-                f"⚠️ *Important:*\n"
+                f"⚠️ <b>Important:</b>\n"
                 f"• You MUST join our channel first\n"
                 f"• Each of your referrals must also join\n"
                 f"• Only unique, non-VPN users count\n\n"
-                f"📢 *Channel:* {CHANNEL_LINK}\n\n"
-                f"👇 *First, join the channel, then click below:*",
-                parse_mode='Markdown',
-                reply_markup=reply_markup
+                f"📢 <b>Channel:</b> {CHANNEL_LINK}\n\n"
+                f"👇 <b>First, join the channel, then click below:</b>",
+                parse_mode=ParseMode.HTML,
+                reply_markup=JOIN_CHANNEL_MARKUP
             )
         else:
             # Already joined, give referral link
@@ -455,38 +1212,35 @@ class NetflixBot:
         
         user_id = query.from_user.id
         
+        # Users already recorded as joined skip the Telegram membership call
+        joined_stats = await db_exec(_fetch_joined_stats, user_id)
+        if joined_stats and joined_stats[0]:
+            await NetflixBot.show_referral_link(update, context, joined_stats[1:])
+            return
+        
         # Check channel membership
         is_member = await check_channel_membership(user_id, context)
         
         if is_member:
-            # Update database
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET channel_joined = 1 WHERE user_id = ?", (user_id,))
-            conn.commit()
-            conn.close()
+            # Update database; the same statement hands back the stats for the link screen
+            user_data = await db_exec(_mark_channel_joined, user_id)
             
             # Show referral link
-            await NetflixBot.show_referral_link(update, context)
+            await NetflixBot.show_referral_link(update, context, user_data)
         else:
             # Not joined yet
-            keyboard = [
-                [InlineKeyboardButton("📢 Join Our Channel", url=CHANNEL_LINK)],
-                [InlineKeyboardButton("✅ I Joined - Get Referral Link", callback_data='verify_and_get_link')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await query.edit_message_text(
-                f"❌ *Not Joined Yet*\n\n"
+                f"❌ <b>Not Joined Yet</b>\n\n"
                 f"You haven't joined our channel.\n\n"
                 f"Please join the channel first, then click 'I Joined'.\n\n"
-                f"📢 *Channel:* {CHANNEL_LINK}",
-                parse_mode='Markdown',
-                reply_markup=reply_markup
+                f"📢 <b>Channel:</b> {CHANNEL_LINK}",
+                parse_mode=ParseMode.HTML,
+                reply_markup=JOIN_CHANNEL_MARKUP
             )
     
     @staticmethod
-    async def show_referral_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def show_referral_link(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                 user_data: Optional[tuple] = None):
         """Show user their referral link and stats"""
         query = update.callback_query
         if query:
@@ -495,23 +1249,16 @@ class NetflixBot:
         else:
             user_id = update.effective_user.id
         
-        # Get user stats
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT referral_code, referral_count, free_profiles_earned 
-               FROM users WHERE user_id = ?""",
-            (user_id,)
-        )
-        user_data = cursor.fetchone()
-        conn.close()
+        # Get user stats unless the caller already has them
+        if user_data is None:
+            user_data = await db_exec(_fetch_referral_stats, user_id)
         
         if user_data:
             ref_code, ref_count, free_earned = user_data
             remaining = REFERRAL_THRESHOLD - (ref_count % REFERRAL_THRESHOLD)
             
-            # Create referral link
-            bot_username = (await context.bot.get_me()).username
+            # Create referral link; PTB caches the bot's own user after initialize()
+            bot_username = context.bot.username
             ref_link = f"https://t.me/{bot_username}?start={ref_code}"
             
             keyboard = [
@@ -523,36 +1270,36 @@ class NetflixBot:
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             message = (
-                f"✅ *Channel Verified!*\n\n"
-                f"🎁 *Your FREE Netflix Path*\n\n"
-                f"👥 Your Referrals: *{ref_count}* / {REFERRAL_THRESHOLD}\n"
-                f"🎉 Free Profiles Earned: *{free_earned}*\n"
-                f"⏳ Next Free Profile in: *{remaining}* referrals\n\n"
-                f"🔗 *Your Referral Link:*\n"
-                f"`{ref_link}`\n\n"
-                f"📋 *How to get FREE Netflix:*\n"
+                f"✅ <b>Channel Verified!</b>\n\n"
+                f"🎁 <b>Your FREE Netflix Path</b>\n\n"
+                f"👥 Your Referrals: <b>{ref_count}</b> / {REFERRAL_THRESHOLD}\n"
+                f"🎉 Free Profiles Earned: <b>{free_earned}</b>\n"
+                f"⏳ Next Free Profile in: <b>{remaining}</b> referrals\n\n"
+                f"🔗 <b>Your Referral Link:</b>\n"
+                f"<code>{ref_link}</code>\n\n"
+                f"📋 <b>How to get FREE Netflix:</b>\n"
                 f"1️⃣ Copy your referral link above\n"
                 f"2️⃣ Share with friends via social media\n"
                 f"3️⃣ Each friend MUST join our channel\n"
                 f"4️⃣ When you reach {REFERRAL_THRESHOLD} referrals = FREE profile!\n\n"
-                f"⚠️ *Rules:*\n"
+                f"⚠️ <b>Rules:</b>\n"
                 f"• All referrals must join: {CHANNEL_LINK}\n"
                 f"• Only unique users count (no VPN/proxy)\n"
                 f"• No multiple accounts from same device\n\n"
-                f"💡 *Tip:* Want instant access? Buy for 50 BDT!"
+                f"💡 <b>Tip:</b> Want instant access? Buy for 50 BDT!"
             )
             
             if query:
                 await query.edit_message_text(
                     message,
-                    parse_mode='Markdown',
+                    parse_mode=ParseMode.HTML,
                     reply_markup=reply_markup
                 )
             else:
                 await context.bot.send_message(
                     chat_id=user_id,
                     text=message,
-                    parse_mode='Markdown',
+                    parse_mode=ParseMode.HTML,
                     reply_markup=reply_markup
                 )
     
@@ -567,49 +1314,42 @@ class NetflixBot:
         is_vpn = detect_vpn(update, ip_hash)
         
         # Register user as paid path (even before payment)
-        register_user(user.id, user.username, user.first_name, 'paid', None, ip_hash, is_vpn)
+        await db_exec(register_user, user.id, user.username, user.first_name, 'paid', None, ip_hash, is_vpn)
         
         # Check if profiles are available
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM profiles WHERE status = 'unsold'")
-        available_count = cursor.fetchone()[0]
-        conn.close()
+        has_stock = await cached('has_stock', ADMIN_VIEW_CACHE_TTL, lambda: db_exec(_has_unsold_profile))
         
-        if available_count == 0:
-            keyboard = [[InlineKeyboardButton("🔙 Back", callback_data='back_to_start')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
+        if not has_stock:
             await query.edit_message_text(
-                "❌ *Sorry! No profiles available right now.*\n\n"
+                "❌ <b>Sorry! No profiles available right now.</b>\n\n"
                 "Please try again later or contact admin.",
-                parse_mode='Markdown',
-                reply_markup=reply_markup
+                parse_mode=ParseMode.HTML,
+                reply_markup=BACK_TO_START_MARKUP
             )
             return ConversationHandler.END
         
         payment_message = (
-            f"💳 *Buy Netflix - Payment Instructions*\n\n"
-            f"💰 Amount: *{PRODUCT_PRICE} BDT Only*\n\n"
-            f"📱 *bKash Number:* `{BKASH_NUMBER}`\n"
-            f"📱 *Nagad Number:* `{NAGAD_NUMBER}`\n\n"
-            f"⚠️ *Payment Instructions:*\n"
+            f"💳 <b>Buy Netflix - Payment Instructions</b>\n\n"
+            f"💰 Amount: <b>{PRODUCT_PRICE} BDT Only</b>\n\n"
+            f"📱 <b>bKash Number:</b> <code>{BKASH_NUMBER}</code>\n"
+            f"📱 <b>Nagad Number:</b> <code>{NAGAD_NUMBER}</code>\n\n"
+            f"⚠️ <b>Payment Instructions:</b>\n"
             f"1️⃣ Send exactly {PRODUCT_PRICE} TK via Send Money\n"
             f"2️⃣ Take a CLEAR screenshot of transaction\n"
             f"3️⃣ Screenshot MUST show:\n"
             f"   • Transaction ID\n"
             f"   • Amount ({PRODUCT_PRICE} BDT)\n"
-            f"   • Date & Time\n\n"
-            f"✅ *Benefits of Paid Path:*\n"
+            f"   • Date &amp; Time\n\n"
+            f"✅ <b>Benefits of Paid Path:</b>\n"
             f"• NO channel join required!\n"
             f"• Get profile within 24 hours\n"
             f"• Direct admin support\n"
             f"• Can still earn via referrals\n\n"
-            f"📸 *Next Step:*\n"
+            f"📸 <b>Next Step:</b>\n"
             f"Send your payment screenshot now ⬇️"
         )
         
-        await query.edit_message_text(payment_message, parse_mode='Markdown')
+        await query.edit_message_text(payment_message, parse_mode=ParseMode.HTML)
         return WAITING_PAYMENT_SCREENSHOT
     
     @staticmethod
@@ -618,18 +1358,12 @@ class NetflixBot:
         query = update.callback_query
         await query.answer()
         
-        keyboard = [
-            [InlineKeyboardButton("🎁 Get Netflix for FREE", callback_data='choose_free')],
-            [InlineKeyboardButton("💳 Buy Netflix (50 BDT)", callback_data='choose_paid')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_text(
-            "📋 *Choose your option:*\n\n"
+            "📋 <b>Choose your option:</b>\n\n"
             "🎁 Get FREE via referrals\n"
             "💳 Buy instantly for 50 BDT",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+            parse_mode=ParseMode.HTML,
+            reply_markup=PRESTART_MARKUP
         )
     
     @staticmethod
@@ -637,64 +1371,53 @@ class NetflixBot:
         """Show main menu for existing users"""
         user = update.effective_user
         
-        keyboard = [
-            [InlineKeyboardButton("🎁 My Referral Link", callback_data='verify_and_get_link')],
-            [InlineKeyboardButton("💳 Buy Netflix", callback_data='choose_paid')],
-            [InlineKeyboardButton("👨‍💼 Contact Admin", url=f'https://t.me/{OWNER_USERNAME[1:]}')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        welcome_message = (
-            f"👋 Welcome back *{user.first_name}*!\n\n"
-            f"🎬 *Netflix Profile Sales Bot*\n\n"
-            f"📋 *Quick Access:*"
-        )
+        welcome_message = WELCOME_BACK_TEMPLATE.format(first_name=html.escape(user.first_name))
         
         await update.message.reply_text(
             welcome_message,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+            parse_mode=ParseMode.HTML,
+            reply_markup=MAIN_MENU_MARKUP
         )
     
+    @staticmethod
+    def scan_screenshot(photo_bytes: bytes) -> Tuple[Optional[str], Optional[int]]:
+        """Decode a downloaded screenshot and OCR it; runs inside an OCR_POOL worker"""
+        image = Image.open(BytesIO(photo_bytes))
+        # Let libjpeg decode straight to a downscaled grayscale image; no-op for other formats
+        image.draft('L', (OCR_MAX_SIDE, OCR_MAX_SIDE))
+        # Screenshots are far larger than tesseract needs; fewer pixels, less OCR time
+        image.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE), Image.BILINEAR)
+        return NetflixBot.extract_transaction_info(image)
+    
     @staticmethod
     def extract_transaction_info(image: Image.Image) -> Tuple[Optional[str], Optional[int]]:
         """Extract Transaction ID and Amount from payment screenshot using OCR"""
         try:
-            image = image.convert('L')
+            # Grayscale keeps the temp image pytesseract writes small; skip the copy if already 'L'
+            if image.mode != 'L':
+                image = image.convert('L')
+            # Stretch the grey range so faint receipt digits stand out after downscaling
+            image = ImageOps.autocontrast(image)
             text = pytesseract.image_to_string(image)
             logger.info(f"OCR extracted text: {text}")
             
-            # Extract Transaction ID
-            trx_patterns = [
-                r'(?:TrxID|Transaction ID|TXN ID|TXNID|TRX)\s*:?\s*([A-Z0-9]{10})',
-                r'\b([A-Z0-9]{10})\b',
-            ]
-            
+            # First match per rule; a later rule only overrides an ID without both letters and digits
             transaction_id = None
-            for pattern in trx_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
+            for pattern in OCR_TRX_PATTERNS:
+                match = pattern.search(text)
                 if match:
                     transaction_id = match.group(1).upper()
-                    if re.search(r'[A-Z]', transaction_id) and re.search(r'[0-9]', transaction_id):
+                    if TRX_VALID_PATTERN.search(transaction_id):
                         break
             
-            # Extract Amount
-            amount_patterns = [
-                r'(?:Amount|Total|Tk|BDT|৳)\s*:?\s*(\d+(?:\.\d{2})?)',
-                r'(\d+(?:\.\d{2})?)\s*(?:Tk|BDT|৳|Taka)',
-                r'\b(50(?:\.00)?)\b',
-            ]
-            
+            # The first rule that finds the product price wins; otherwise the last rule that matched
             amount = None
-            for pattern in amount_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
+            for pattern in OCR_AMOUNT_PATTERNS:
+                match = pattern.search(text)
                 if match:
-                    try:
-                        amount = int(float(match.group(1)))
-                        if amount == PRODUCT_PRICE:
-                            break
-                    except ValueError:
-                        continue
+                    amount = int(float(match.group(1)))
+                    if amount == PRODUCT_PRICE:
+                        break
             
             return transaction_id, amount
             
@@ -718,45 +1441,22 @@ class NetflixBot:
         try:
             # Download photo
             photo_file = await update.message.photo[-1].get_file()
-            photo_bytes = await photo_file.download_as_bytearray()
-            image = Image.open(BytesIO(photo_bytes))
+            # getvalue() hands back the buffer without copying; a bytearray would need one more copy
+            photo_buffer = BytesIO()
+            await photo_file.download_to_memory(out=photo_buffer)
+            photo_bytes = photo_buffer.getvalue()
             file_id = update.message.photo[-1].file_id
             
-            # Extract transaction info
-            trx_id, amount = NetflixBot.extract_transaction_info(image)
-            
-            # Save to pending payments
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                """INSERT INTO pending_payments (user_id, username, screenshot_file_id, trxid, amount) 
-                   VALUES (?, ?, ?, ?, ?)""",
-                (user.id, user.username, file_id, trx_id, amount)
+            # Extract transaction info; the worker gets the compressed bytes, not a decoded image
+            trx_id, amount = await asyncio.get_running_loop().run_in_executor(
+                OCR_POOL, NetflixBot.scan_screenshot, photo_bytes
             )
-            payment_id = cursor.lastrowid
-            
-            # Mark user as paid user
-            cursor.execute("UPDATE users SET is_paid_user = 1 WHERE user_id = ?", (user.id,))
             
-            conn.commit()
-            conn.close()
-            
-            # Notify user
-            await update.message.reply_text(
-                f"✅ *Payment Submitted Successfully!*\n\n"
-                f"📝 Payment ID: `{payment_id}`\n"
-                f"💳 Transaction ID: `{trx_id if trx_id else 'Auto-detected'}`\n"
-                f"💰 Amount: {amount if amount else 'Auto-detected'} BDT\n\n"
-                f"⏳ *Status:* Pending Admin Approval\n\n"
-                f"Your payment is under review. You'll receive your Netflix profile "
-                f"within 24 hours after approval.\n\n"
-                f"✅ *Benefit:* As a paid user, you can use all features without channel join!\n\n"
-                f"Thank you for your patience! 🙏",
-                parse_mode='Markdown'
-            )
+            # Save to pending payments
+            payment_id = await submit_payment(user.id, user.username, file_id, trx_id, amount)
+            invalidate_admin_views()
             
-            # Notify all admins
+            # Notify all admins in the background so the user's confirmation goes out first
             keyboard = [
                 [
                     InlineKeyboardButton("✅ Approve", callback_data=f'approve_payment_{payment_id}'),
@@ -766,52 +1466,187 @@ class NetflixBot:
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             admin_message = (
-                f"🔔 *New Payment Submission*\n\n"
-                f"👤 User: {user.first_name} (@{user.username if user.username else 'N/A'})\n"
-                f"🆔 User ID: `{user.id}`\n"
-                f"📝 Payment ID: `{payment_id}`\n"
-                f"💳 TrxID: `{trx_id if trx_id else 'Not detected'}`\n"
+                f"🔔 <b>New Payment Submission</b>\n\n"
+                f"👤 User: {html.escape(user.first_name)} (@{html.escape(user.username or 'N/A')})\n"
+                f"🆔 User ID: <code>{user.id}</code>\n"
+                f"📝 Payment ID: <code>{payment_id}</code>\n"
+                f"💳 TrxID: <code>{html.escape(trx_id) if trx_id else 'Not detected'}</code>\n"
                 f"💰 Amount: {amount if amount else 'Not detected'} BDT\n"
                 f"💼 User Type: Paid User\n\n"
-                f"⏰ Submitted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+                f"⏰ Submitted: {time.strftime(TIMESTAMP_FORMAT)}"
             )
             
-            for admin_id in ADMIN_LIST:
-                try:
-                    await context.bot.send_photo(
-                        chat_id=admin_id,
-                        photo=file_id,
-                        caption=admin_message,
-                        parse_mode='Markdown',
-                        reply_markup=reply_markup
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to notify admin {admin_id}: {e}")
+            run_in_background(notify_admins(
+                context.bot,
+                admin_message,
+                photo=file_id,
+                parse_mode=ParseMode.HTML,
+                reply_markup=reply_markup
+            ))
+            
+            # Notify user
+            await update.message.reply_text(
+                f"✅ <b>Payment Submitted Successfully!</b>\n\n"
+                f"📝 Payment ID: <code>{payment_id}</code>\n"
+                f"💳 Transaction ID: <code>{html.escape(trx_id) if trx_id else 'Auto-detected'}</code>\n"
+                f"💰 Amount: {amount if amount else 'Auto-detected'} BDT\n\n"
+                f"⏳ <b>Status:</b> Pending Admin Approval\n\n"
+                f"Your payment is under review. You'll receive your Netflix profile "
+                f"within 24 hours after approval.\n\n"
+                f"✅ <b>Benefit:</b> As a paid user, you can use all features without channel join!\n\n"
+                f"Thank you for your patience! 🙏",
+                parse_mode=ParseMode.HTML
+            )
             
             return ConversationHandler.END
             
         except Exception as e:
             logger.error(f"Error processing screenshot: {e}")
             await update.message.reply_text(
-                "❌ *Processing Error*\n\n"
+                "❌ <b>Processing Error</b>\n\n"
                 "An error occurred. Please try again or contact admin.",
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
             )
             return ConversationHandler.END
     
     @staticmethod
     async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Cancel the current operation"""
-        keyboard = [[InlineKeyboardButton("🔙 Back", callback_data='back_to_start')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await update.message.reply_text(
             "❌ Operation cancelled.",
-            reply_markup=reply_markup
+            reply_markup=BACK_TO_START_MARKUP
         )
         return ConversationHandler.END
 
 
+# Admin database operations, executed in worker threads via db_exec
+def _fetch_pending_payments(conn: sqlite3.Connection) -> List[tuple]:
+    """Latest pending payments for the admin queue"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_GET_PENDING)
+    return cursor.fetchall()
+
+
+@retry_on_locked
+def _approve_payment(conn: sqlite3.Connection, payment_id: int) -> Tuple[Optional[tuple], Optional[tuple]]:
+    """Assign an unsold profile to a payment; returns (payment, profile)"""
+    cursor = conn.cursor()
+    
+    # All writes share one transaction; claiming rows with UPDATE ... RETURNING
+    # means two admins tapping at once can't approve twice or share a profile.
+    # BEGIN IMMEDIATE takes the write lock before the first read, and the with
+    # block rolls everything back if any statement fails
+    with conn:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(SQL_APPROVE_PAYMENT, (payment_id,))
+        payment = cursor.fetchone()
+        if not payment:
+            return None, None
+        
+        user_id, username, trxid, amount = payment
+        
+        cursor.execute(SQL_CLAIM_PROFILE, (user_id,))
+        profile = cursor.fetchone()
+        if not profile:
+            # Leave the payment pending until stock is added
+            conn.rollback()
+            return payment, None
+        
+        # Record sale
+        cursor.execute(
+            SQL_INSERT_SALE,
+            (user_id, username, trxid or f'PAY{payment_id}', amount or PRODUCT_PRICE, profile[0])
+        )
+        
+        # Ensure user is marked as paid user
+        cursor.execute(SQL_MARK_USER_PAID, (user_id,))
+    
+    return payment, profile
+
+
+@retry_on_locked
+def _reject_payment(conn: sqlite3.Connection, payment_id: int, reason: str) -> Optional[int]:
+    """Mark a payment rejected; returns the paying user's id if it exists"""
+    cursor = conn.cursor()
+    
+    cursor.execute(SQL_GET_PAYMENT_USER, (payment_id,))
+    payment = cursor.fetchone()
+    if not payment:
+        return None
+    
+    cursor.execute(SQL_REJECT_PAYMENT, (reason, payment_id))
+    conn.commit()
+    return payment[0]
+
+
+@retry_on_locked
+def _save_appeal(conn: sqlite3.Connection, payment_id: int, appeal_text: str):
+    """Store a user's appeal against a rejected payment"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_SAVE_APPEAL, (appeal_text, payment_id))
+    conn.commit()
+
+
+def _fetch_user_id_page(conn: sqlite3.Connection, after_user_id: int, limit: int) -> List[int]:
+    """Next page of user ids after after_user_id, for broadcasts"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_GET_USER_ID_PAGE, (after_user_id, limit))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _fetch_stats(conn: sqlite3.Connection) -> Tuple[int, int, int, int, int]:
+    """Sales, revenue, user and pending counters for the stats screen"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_ADMIN_STATS)
+    return cursor.fetchone()
+
+
+def _fetch_stock(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """Unsold and sold profile counts"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_COUNT_PROFILE_STOCK)
+    return cursor.fetchone()
+
+
+def _fetch_top_referrers(conn: sqlite3.Connection) -> List[tuple]:
+    """Top ten referrers by referral count"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_TOP_REFERRERS)
+    return cursor.fetchall()
+
+
+@retry_on_locked
+def _insert_profiles(conn: sqlite3.Connection, lines: List[str]) -> Tuple[int, int, int]:
+    """Insert email:password:pin lines; returns (added, duplicates, invalid line count)"""
+    rows = []
+    invalid = 0
+    for line in lines:
+        parts = line.split(':')
+        if len(parts) == 3:
+            rows.append(tuple(p.strip() for p in parts))
+        elif line.strip():
+            invalid += 1
+    
+    if not rows:
+        return 0, 0, invalid
+    
+    # One transaction for the whole batch, so a single commit/fsync; multi-row
+    # VALUES chunks keep bound parameters well under SQLite's limit
+    added = 0
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        for i in range(0, len(rows), PROFILE_INSERT_CHUNK):
+            chunk = rows[i:i + PROFILE_INSERT_CHUNK]
+            cursor.execute(
+                "INSERT OR IGNORE INTO profiles (email, password, profile_pin) VALUES "
+                + ", ".join(["(?, ?, ?)"] * len(chunk)),
+                [value for row in chunk for value in row]
+            )
+            added += cursor.rowcount
+    return added, len(rows) - added, invalid
+
+
 class AdminPanel:
     """Admin commands for bot management"""
     
@@ -822,30 +1657,11 @@ class AdminPanel:
             await update.message.reply_text("❌ Unauthorized access.")
             return
         
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Pending Payments", callback_data='admin_pending'),
-                InlineKeyboardButton("📊 Stats", callback_data='admin_stats')
-            ],
-            [
-                InlineKeyboardButton("➕ Add Profiles", callback_data='admin_add_profiles'),
-                InlineKeyboardButton("📦 Stock", callback_data='admin_stock')
-            ],
-            [
-                InlineKeyboardButton("📢 Broadcast", callback_data='admin_broadcast'),
-                InlineKeyboardButton("💬 Message User", callback_data='admin_message_user')
-            ],
-            [
-                InlineKeyboardButton("👥 Admins List", callback_data='admin_list'),
-                InlineKeyboardButton("🎁 Referrals", callback_data='admin_referrals')
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            "🔐 *Admin Panel*\n\nSelect an option:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+        # Also reached from the Back buttons, where there is no command message to reply to
+        await update.effective_message.reply_text(
+            ADMIN_PANEL_TEXT,
+            entities=ADMIN_PANEL_ENTITIES,
+            reply_markup=ADMIN_PANEL_MARKUP
         )
     
     @staticmethod
@@ -857,15 +1673,7 @@ class AdminPanel:
         if not is_admin(query.from_user.id):
             return
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT id, user_id, username, trxid, amount, submitted_at 
-               FROM pending_payments WHERE status = 'pending' 
-               ORDER BY submitted_at DESC LIMIT 10"""
-        )
-        pending = cursor.fetchall()
-        conn.close()
+        pending = await cached('pending', ADMIN_VIEW_CACHE_TTL, lambda: db_exec(_fetch_pending_payments))
         
         if not pending:
             await query.edit_message_text(
@@ -873,22 +1681,17 @@ class AdminPanel:
             )
             return
         
-        message = "⏳ *Pending Payments*\n\n"
-        for pay in pending:
-            pay_id, user_id, username, trxid, amount, submitted = pay
-            message += (
-                f"📝 ID: `{pay_id}` | User: @{username or 'N/A'}\n"
-                f"💳 TrxID: `{trxid or 'N/A'}` | 💰 {amount or '?'} BDT\n"
-                f"⏰ {submitted}\n\n"
-            )
-        
-        keyboard = [[InlineKeyboardButton("🔙 Back", callback_data='back_to_admin')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message = "⏳ <b>Pending Payments</b>\n\n" + "".join(
+            f"📝 ID: <code>{pay_id}</code> | User: @{html.escape(username or 'N/A')}\n"
+            f"💳 TrxID: <code>{html.escape(trxid or 'N/A')}</code> | 💰 {amount or '?'} BDT\n"
+            f"⏰ {submitted}\n\n"
+            for pay_id, user_id, username, trxid, amount, submitted in pending
+        )
         
         await query.edit_message_text(
             message,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+            parse_mode=ParseMode.HTML,
+            reply_markup=BACK_TO_ADMIN_MARKUP
         )
     
     @staticmethod
@@ -900,106 +1703,56 @@ class AdminPanel:
         if not is_admin(query.from_user.id):
             return
         
-        payment_id = int(query.data.split('_')[-1])
-        
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        payment_id = parse_callback_id(query.data)
+        if payment_id is None:
+            return
         
-        # Get payment details
-        cursor.execute(
-            "SELECT user_id, username, trxid, amount FROM pending_payments WHERE id = ?",
-            (payment_id,)
-        )
-        payment = cursor.fetchone()
+        payment, profile = await db_exec(_approve_payment, payment_id)
+        invalidate_admin_views()
         
         if not payment:
             await query.edit_message_caption(
                 caption="❌ Payment not found or already processed."
             )
-            conn.close()
             return
         
-        user_id, username, trxid, amount = payment
-        
-        # Check for available profile
-        cursor.execute(
-            "SELECT id, email, password, profile_pin FROM profiles WHERE status = 'unsold' LIMIT 1"
-        )
-        profile = cursor.fetchone()
-        
         if not profile:
             await query.edit_message_caption(
                 caption="❌ No profiles available! Add profiles first."
             )
-            conn.close()
             return
         
-        profile_id, email, password, pin = profile
-        
-        # Mark payment as approved
-        cursor.execute(
-            "UPDATE pending_payments SET status = 'approved' WHERE id = ?",
-            (payment_id,)
-        )
-        
-        # Record sale
-        cursor.execute(
-            """INSERT INTO sales (user_id, username, trxid, amount, profile_id, status) 
-               VALUES (?, ?, ?, ?, ?, 'completed')""",
-            (user_id, username, trxid or f'PAY{payment_id}', amount or PRODUCT_PRICE, profile_id)
-        )
-        
-        # Mark profile as sold
-        cursor.execute(
-            """UPDATE profiles 
-               SET status = 'sold', sold_at = ?, sold_to_user_id = ? 
-               WHERE id = ?""",
-            (datetime.now(), user_id, profile_id)
-        )
-        
-        # Ensure user is marked as paid user
-        cursor.execute("UPDATE users SET is_paid_user = 1 WHERE user_id = ?", (user_id,))
-        
-        conn.commit()
-        conn.close()
+        user_id = payment[0]
+        email, password, pin = profile[1:]
         
         # Send profile to user
-        success_message = (
-            "✅ *Payment Approved!*\n\n"
-            "🎬 *Your Netflix Profile:*\n\n"
-            f"📧 *Email:* `{email}`\n"
-            f"🔑 *Password:* `{password}`\n"
-            f"📍 *Profile PIN:* `{pin}`\n\n"
-            f"⏱ *Valid for:* 1 Month\n"
-            f"💳 *Payment ID:* `{payment_id}`\n\n"
-            "⚠️ *Important Notes:*\n"
-            "• Do NOT change the password\n"
-            "• Use only your assigned profile\n"
-            "• Save these credentials securely\n\n"
-            "✨ Enjoy your Netflix! 🍿\n\n"
-            "💡 *Bonus:* Share your referral link to earn more FREE profiles!"
-        )
+        success_message = APPROVED_TEMPLATE % {
+            'email': html.escape(email),
+            'password': html.escape(password),
+            'pin': html.escape(pin),
+            'payment_id': payment_id
+        }
         
         try:
             await context.bot.send_message(
                 chat_id=user_id,
                 text=success_message,
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
             )
             
             await query.edit_message_caption(
-                caption=f"✅ *Payment Approved & Profile Delivered!*\n\n"
-                        f"User ID: `{user_id}`\n"
-                        f"Payment ID: `{payment_id}`\n"
+                caption=f"✅ <b>Payment Approved &amp; Profile Delivered!</b>\n\n"
+                        f"User ID: <code>{user_id}</code>\n"
+                        f"Payment ID: <code>{payment_id}</code>\n"
                         f"Profile sent successfully!",
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
             )
         except Exception as e:
             logger.error(f"Failed to send profile to user {user_id}: {e}")
             await query.edit_message_caption(
                 caption=f"⚠️ Profile assigned but failed to send message.\n"
-                        f"User ID: `{user_id}` - Contact manually.",
-                parse_mode='Markdown'
+                        f"User ID: <code>{user_id}</code> - Contact manually.",
+                parse_mode=ParseMode.HTML
             )
     
     @staticmethod
@@ -1011,22 +1764,15 @@ class AdminPanel:
         if not is_admin(query.from_user.id):
             return
         
-        payment_id = int(query.data.split('_')[-1])
+        payment_id = parse_callback_id(query.data)
+        if payment_id is None:
+            return
         
         # Ask for rejection reason
-        keyboard = [
-            [InlineKeyboardButton("Invalid Screenshot", callback_data=f'reject_reason_invalid_{payment_id}')],
-            [InlineKeyboardButton("Wrong Amount", callback_data=f'reject_reason_amount_{payment_id}')],
-            [InlineKeyboardButton("Duplicate Transaction", callback_data=f'reject_reason_duplicate_{payment_id}')],
-            [InlineKeyboardButton("Unclear Screenshot", callback_data=f'reject_reason_unclear_{payment_id}')],
-            [InlineKeyboardButton("🔙 Cancel", callback_data='back_to_admin')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_caption(
-            caption="⚠️ *Select Rejection Reason:*",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+            caption="⚠️ <b>Select Rejection Reason:</b>",
+            parse_mode=ParseMode.HTML,
+            reply_markup=rejection_reasons_markup(payment_id)
         )
     
     @staticmethod
@@ -1038,36 +1784,17 @@ class AdminPanel:
         if not is_admin(query.from_user.id):
             return
         
-        parts = query.data.split('_')
-        reason_key = parts[2]
-        payment_id = int(parts[3])
-        
-        reason_map = {
-            'invalid': 'Invalid or fake screenshot',
-            'amount': 'Wrong amount paid',
-            'duplicate': 'Duplicate transaction',
-            'unclear': 'Screenshot is unclear/unreadable'
-        }
-        
-        reason = reason_map.get(reason_key, 'Payment could not be verified')
+        match = PAYMENT_CALLBACK_PATTERN.fullmatch(query.data)
+        if not match:
+            return
+        reason_key, payment_id = match[2], int(match[3])
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        reason = _REASON_MAP.get(reason_key, 'Payment could not be verified')
         
-        cursor.execute(
-            "SELECT user_id FROM pending_payments WHERE id = ?",
-            (payment_id,)
-        )
-        payment = cursor.fetchone()
+        user_id = await db_exec(_reject_payment, payment_id, reason)
+        invalidate_admin_views()
         
-        if payment:
-            user_id = payment[0]
-            cursor.execute(
-                "UPDATE pending_payments SET status = 'rejected', rejection_reason = ? WHERE id = ?",
-                (reason, payment_id)
-            )
-            conn.commit()
-            
+        if user_id is not None:
             # Notify user with appeal option
             keyboard = [
                 [InlineKeyboardButton("📝 Appeal Rejection", callback_data=f'appeal_rejection_{payment_id}')],
@@ -1077,19 +1804,19 @@ class AdminPanel:
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             try:
-                await context.bot.send_message(
+                await safe_send(lambda: context.bot.send_message(
                     chat_id=user_id,
-                    text=f"❌ *Payment Rejected*\n\n"
-                         f"Payment ID: `{payment_id}`\n"
+                    text=f"❌ <b>Payment Rejected</b>\n\n"
+                         f"Payment ID: <code>{payment_id}</code>\n"
                          f"Reason: {reason}\n\n"
-                         f"⚠️ *What you can do:*\n"
+                         f"⚠️ <b>What you can do:</b>\n"
                          f"1️⃣ Appeal this decision (if you think it's a mistake)\n"
                          f"2️⃣ Submit a new payment with correct screenshot\n"
                          f"3️⃣ Contact admin for clarification\n\n"
                          f"We're here to help! 🙏",
-                    parse_mode='Markdown',
+                    parse_mode=ParseMode.HTML,
                     reply_markup=reply_markup
-                )
+                ), user_id)
             except:
                 pass
             
@@ -1097,10 +1824,8 @@ class AdminPanel:
                 caption=f"❌ Payment {payment_id} rejected.\n"
                         f"Reason: {reason}\n"
                         f"User can appeal or resubmit.",
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
             )
-        
-        conn.close()
     
     @staticmethod
     async def start_appeal(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1108,16 +1833,18 @@ class AdminPanel:
         query = update.callback_query
         await query.answer()
         
-        payment_id = int(query.data.split('_')[-1])
+        payment_id = parse_callback_id(query.data)
+        if payment_id is None:
+            return
         context.user_data['appealing_payment_id'] = payment_id
         
         await query.edit_message_text(
-            f"📝 *Appeal Payment Rejection*\n\n"
-            f"Payment ID: `{payment_id}`\n\n"
+            f"📝 <b>Appeal Payment Rejection</b>\n\n"
+            f"Payment ID: <code>{payment_id}</code>\n\n"
             f"Please explain why this payment should be approved.\n\n"
             f"Send your appeal message now ⬇️\n\n"
             f"Send /cancel to abort.",
-            parse_mode='Markdown'
+            parse_mode=ParseMode.HTML
         )
         
         return WAITING_REJECTION_APPEAL
@@ -1135,45 +1862,29 @@ class AdminPanel:
         appeal_text = update.message.text
         
         # Update database
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE pending_payments SET appeal_message = ?, appeal_submitted_at = ? WHERE id = ?",
-            (appeal_text, datetime.now(), payment_id)
+        await db_exec(_save_appeal, payment_id, appeal_text)
+        
+        # Notify all admins in the background so the user's confirmation isn't held up
+        admin_message = (
+            f"📮 <b>Payment Appeal Received</b>\n\n"
+            f"👤 User: {html.escape(user.first_name)} (@{html.escape(user.username or 'N/A')})\n"
+            f"🆔 User ID: <code>{user.id}</code>\n"
+            f"📝 Payment ID: <code>{payment_id}</code>\n\n"
+            f"💬 <b>Appeal:</b>\n{html.escape(appeal_text)}\n\n"
+            f"⏰ {time.strftime(TIMESTAMP_FORMAT)}"
         )
-        conn.commit()
-        conn.close()
+        run_in_background(notify_admins(context.bot, admin_message, parse_mode=ParseMode.HTML))
         
         # Notify user
         await update.message.reply_text(
-            f"✅ *Appeal Submitted!*\n\n"
-            f"Payment ID: `{payment_id}`\n\n"
+            f"✅ <b>Appeal Submitted!</b>\n\n"
+            f"Payment ID: <code>{payment_id}</code>\n\n"
             f"Your appeal has been forwarded to admins.\n"
             f"You'll receive a response within 24 hours.\n\n"
             f"Thank you! 🙏",
-            parse_mode='Markdown'
+            parse_mode=ParseMode.HTML
         )
         
-        # Notify all admins
-        admin_message = (
-            f"📮 *Payment Appeal Received*\n\n"
-            f"👤 User: {user.first_name} (@{user.username or 'N/A'})\n"
-            f"🆔 User ID: `{user.id}`\n"
-            f"📝 Payment ID: `{payment_id}`\n\n"
-            f"💬 *Appeal:*\n{appeal_text}\n\n"
-            f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        )
-        
-        for admin_id in ADMIN_LIST:
-            try:
-                await context.bot.send_message(
-                    chat_id=admin_id,
-                    text=admin_message,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Failed to notify admin {admin_id}: {e}")
-        
         return ConversationHandler.END
     
     @staticmethod
@@ -1186,10 +1897,10 @@ class AdminPanel:
             return
         
         await query.edit_message_text(
-            "📢 *Broadcast Message*\n\n"
+            "📢 <b>Broadcast Message</b>\n\n"
             "Send the message to broadcast to all users.\n\n"
             "Send /cancel to abort.",
-            parse_mode='Markdown'
+            parse_mode=ParseMode.HTML
         )
         return WAITING_BROADCAST_MESSAGE
     
@@ -1201,29 +1912,56 @@ class AdminPanel:
         
         await update.message.reply_text("📤 Broadcasting...")
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM users")
-        users = cursor.fetchall()
-        conn.close()
-        
+        # Recipients are paged in from the DB while workers send, so memory
+        # stays bounded by the queue rather than the size of the users table
+        recipients: asyncio.Queue = asyncio.Queue(maxsize=BROADCAST_CONCURRENCY * 4)
         success = 0
+        blocked = 0
         failed = 0
         
-        for user in users:
-            user_id = user[0]
+        # The payload is the same for everyone; only chat_id varies per recipient
+        copy_to = functools.partial(
+            context.bot.copy_message,
+            from_chat_id=update.message.chat_id,
+            message_id=update.message.message_id
+        )
+        
+        async def produce():
+            last_user_id = 0
             try:
-                await update.message.copy(chat_id=user_id)
-                success += 1
-            except Exception as e:
-                failed += 1
-                logger.error(f"Broadcast failed for {user_id}: {e}")
+                while True:
+                    page = await db_exec(_fetch_user_id_page, last_user_id, BROADCAST_PAGE_SIZE)
+                    for user_id in page:
+                        await recipients.put(user_id)
+                    if len(page) < BROADCAST_PAGE_SIZE:
+                        break
+                    last_user_id = page[-1]
+            finally:
+                # Always release the workers, even if paging failed
+                for _ in range(BROADCAST_CONCURRENCY):
+                    await recipients.put(None)
+        
+        async def send_worker():
+            nonlocal success, blocked, failed
+            while (user_id := await recipients.get()) is not None:
+                try:
+                    await safe_send(functools.partial(copy_to, chat_id=user_id), user_id)
+                    success += 1
+                except Forbidden:
+                    # safe_send already marked the user as blocked
+                    blocked += 1
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Broadcast failed for {user_id}: {e}")
+        
+        await asyncio.gather(produce(), *(send_worker() for _ in range(BROADCAST_CONCURRENCY)))
         
         await update.message.reply_text(
-            f"✅ *Broadcast Complete!*\n\n"
+            f"✅ <b>Broadcast Complete!</b>\n\n"
             f"✅ Sent: {success}\n"
+            f"🚫 Blocked: {blocked}\n"
             f"❌ Failed: {failed}",
-            parse_mode='Markdown'
+            parse_mode=ParseMode.HTML
         )
         return ConversationHandler.END
     
@@ -1237,8 +1975,8 @@ class AdminPanel:
             return
         
         await query.edit_message_text(
-            "💬 *Message User*\n\nSend User ID.\n\nSend /cancel to abort.",
-            parse_mode='Markdown'
+            "💬 <b>Message User</b>\n\nSend User ID.\n\nSend /cancel to abort.",
+            parse_mode=ParseMode.HTML
         )
         return WAITING_USER_ID_TO_MESSAGE
     
@@ -1248,18 +1986,19 @@ class AdminPanel:
         if not is_admin(update.effective_user.id):
             return ConversationHandler.END
         
-        try:
-            user_id = int(update.message.text.strip())
-            context.user_data['message_target_user'] = user_id
-            
-            await update.message.reply_text(
-                f"📝 Send message for User ID: `{user_id}`\n\nSend /cancel to abort.",
-                parse_mode='Markdown'
-            )
-            return WAITING_MESSAGE_TO_USER
-        except ValueError:
+        text = update.message.text.strip()
+        if not CHAT_ID_PATTERN.fullmatch(text) or abs(int(text)) > MAX_CHAT_ID:
             await update.message.reply_text("❌ Invalid User ID.")
             return WAITING_USER_ID_TO_MESSAGE
+        
+        user_id = int(text)
+        context.user_data['message_target_user'] = user_id
+        
+        await update.message.reply_text(
+            f"📝 Send message for User ID: <code>{user_id}</code>\n\nSend /cancel to abort.",
+            parse_mode=ParseMode.HTML
+        )
+        return WAITING_MESSAGE_TO_USER
     
     @staticmethod
     async def send_message_to_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1273,104 +2012,130 @@ class AdminPanel:
             return ConversationHandler.END
         
         try:
-            await update.message.copy(chat_id=target_user)
-            await context.bot.send_message(
-                chat_id=target_user,
-                text=f"_Message from Admin {OWNER_USERNAME}_",
-                parse_mode='Markdown'
+            await safe_send(lambda: update.message.copy(chat_id=target_user), target_user)
+            await safe_send(
+                lambda: context.bot.send_message(
+                    chat_id=target_user,
+                    text=f"<i>Message from Admin {html.escape(OWNER_USERNAME)}</i>",
+                    parse_mode=ParseMode.HTML
+                ),
+                target_user
             )
             
-            await update.message.reply_text(f"✅ Sent to User ID: `{target_user}`", parse_mode='Markdown')
+            await update.message.reply_text(f"✅ Sent to User ID: <code>{target_user}</code>", parse_mode=ParseMode.HTML)
         except Exception as e:
             await update.message.reply_text(f"❌ Failed: {str(e)}")
         
         return ConversationHandler.END
     
     @staticmethod
-    async def admin_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle admin buttons"""
+    async def admin_add_profiles(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ask for profiles to add"""
         query = update.callback_query
         await query.answer()
         
         if not is_admin(query.from_user.id):
             return
         
-        if query.data == 'admin_pending':
-            await AdminPanel.admin_pending_payments(update, context)
-        elif query.data == 'admin_add_profiles':
-            await query.edit_message_text(
-                "➕ *Add Profiles*\n\nFormat:\n`email:password:pin`\n\nSend /cancel to abort.",
-                parse_mode='Markdown'
-            )
-            return WAITING_BULK_PROFILES
-        elif query.data == 'admin_stats':
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*), SUM(amount) FROM sales WHERE status = 'completed'")
-            total_sales, total_revenue = cursor.fetchone()
-            cursor.execute("SELECT COUNT(*) FROM users")
-            total_users = cursor.fetchone()[0]
-            cursor.execute("SELECT COUNT(*) FROM users WHERE is_paid_user = 1")
-            paid_users = cursor.fetchone()[0]
-            cursor.execute("SELECT COUNT(*) FROM pending_payments WHERE status = 'pending'")
-            pending = cursor.fetchone()[0]
-            
-            conn.close()
-            
-            keyboard = [[InlineKeyboardButton("🔙 Back", callback_data='back_to_admin')]]
-            
-            await query.edit_message_text(
-                f"📊 *Statistics*\n\n"
-                f"💰 Revenue: *{total_revenue or 0} BDT*\n"
-                f"📈 Sales: *{total_sales}*\n"
-                f"👥 Users: *{total_users}*\n"
-                f"💳 Paid: *{paid_users}*\n"
-                f"⏳ Pending: *{pending}*",
-                parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif query.data == 'admin_stock':
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM profiles WHERE status = 'unsold'")
-            unsold = cursor.fetchone()[0]
-            cursor.execute("SELECT COUNT(*) FROM profiles WHERE status = 'sold'")
-            sold = cursor.fetchone()[0]
-            conn.close()
-            
-            keyboard = [[InlineKeyboardButton("🔙 Back", callback_data='back_to_admin')]]
-            
-            await query.edit_message_text(
-                f"📦 *Stock*\n\n✅ Available: *{unsold}*\n❌ Sold: *{sold}*",
-                parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif query.data == 'admin_list':
-            keyboard = [[InlineKeyboardButton("🔙 Back", callback_data='back_to_admin')]]
-            await query.edit_message_text(
-                f"👥 *Admins*\n\n{', '.join(map(str, ADMIN_LIST))}",
-                parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif query.data == 'admin_referrals':
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            cursor.execute(
-                """SELECT first_name, username, referral_count, free_profiles_earned 
-                   FROM users WHERE referral_count > 0 ORDER BY referral_count DESC LIMIT 10"""
+        await query.edit_message_text(
+            "➕ <b>Add Profiles</b>\n\nFormat:\n<code>email:password:pin</code>\n\nSend /cancel to abort.",
+            parse_mode=ParseMode.HTML
+        )
+        return WAITING_BULK_PROFILES
+    
+    @staticmethod
+    async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show sales and user statistics"""
+        query = update.callback_query
+        await query.answer()
+        
+        if not is_admin(query.from_user.id):
+            return
+        
+        total_sales, total_revenue, total_users, paid_users, pending = await cached(
+            'stats', ADMIN_VIEW_CACHE_TTL, lambda: db_exec(_fetch_stats)
+        )
+        
+        await query.edit_message_text(
+            f"📊 <b>Statistics</b>\n\n"
+            f"💰 Revenue: <b>{total_revenue or 0} BDT</b>\n"
+            f"📈 Sales: <b>{total_sales}</b>\n"
+            f"👥 Users: <b>{total_users}</b>\n"
+            f"💳 Paid: <b>{paid_users}</b>\n"
+            f"⏳ Pending: <b>{pending}</b>",
+            parse_mode=ParseMode.HTML,
+            reply_markup=BACK_TO_ADMIN_MARKUP
+        )
+    
+    @staticmethod
+    async def admin_stock(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show profile stock"""
+        query = update.callback_query
+        await query.answer()
+        
+        if not is_admin(query.from_user.id):
+            return
+        
+        unsold, sold = await cached('stock', ADMIN_VIEW_CACHE_TTL, lambda: db_exec(_fetch_stock))
+        
+        await query.edit_message_text(
+            f"📦 <b>Stock</b>\n\n✅ Available: <b>{unsold}</b>\n❌ Sold: <b>{sold}</b>",
+            parse_mode=ParseMode.HTML,
+            reply_markup=BACK_TO_ADMIN_MARKUP
+        )
+    
+    @staticmethod
+    async def admin_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show configured admins"""
+        query = update.callback_query
+        await query.answer()
+        
+        if not is_admin(query.from_user.id):
+            return
+        
+        # Keep the message bounded however many admins are configured
+        admin_ids = sorted(ADMIN_SET)
+        shown = ', '.join(map(str, admin_ids[:ADMIN_LIST_LIMIT]))
+        if len(admin_ids) > ADMIN_LIST_LIMIT:
+            shown += f"\n… and {len(admin_ids) - ADMIN_LIST_LIMIT} more"
+        
+        await query.edit_message_text(
+            f"👥 <b>Admins ({len(admin_ids)})</b>\n\n{shown}",
+            parse_mode=ParseMode.HTML,
+            reply_markup=BACK_TO_ADMIN_MARKUP
+        )
+    
+    @staticmethod
+    async def admin_referrals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show top referrers"""
+        query = update.callback_query
+        await query.answer()
+        
+        if not is_admin(query.from_user.id):
+            return
+        
+        top = await db_exec(_fetch_top_referrers)
+        
+        if top:
+            message = "🎁 <b>Top Referrers</b>\n\n" + "".join(
+                f"{html.escape(ref[0] or '')} (@{html.escape(ref[1] or 'N/A')}): {ref[2]} refs | {ref[3]} free\n"
+                for ref in top
             )
-            top = cursor.fetchall()
-            conn.close()
-            
-            message = "🎁 *Top Referrers*\n\n" if top else "No referrals yet."
-            for ref in top:
-                message += f"{ref[0]} (@{ref[1] or 'N/A'}): {ref[2]} refs | {ref[3]} free\n"
-            
-            keyboard = [[InlineKeyboardButton("🔙 Back", callback_data='back_to_admin')]]
-            await query.edit_message_text(message, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-        elif query.data == 'back_to_admin':
-            await AdminPanel.admin(update, context)
+        else:
+            message = "No referrals yet."
+        
+        await query.edit_message_text(message, parse_mode=ParseMode.HTML, reply_markup=BACK_TO_ADMIN_MARKUP)
+    
+    @staticmethod
+    async def back_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Return to the admin panel"""
+        query = update.callback_query
+        await query.answer()
+        
+        if not is_admin(query.from_user.id):
+            return
+        
+        await AdminPanel.admin(update, context)
     
     @staticmethod
     async def receive_bulk_profiles(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1379,47 +2144,107 @@ class AdminPanel:
             return ConversationHandler.END
         
         lines = update.message.text.strip().split('\n')
-        added = 0
-        
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        for line in lines:
-            parts = line.split(':')
-            if len(parts) == 3:
-                try:
-                    cursor.execute(
-                        "INSERT INTO profiles (email, password, profile_pin) VALUES (?, ?, ?)",
-                        tuple(p.strip() for p in parts)
-                    )
-                    added += 1
-                except:
-                    pass
-        
-        conn.commit()
-        conn.close()
-        
-        await update.message.reply_text(f"✅ Added {added} profiles!", parse_mode='Markdown')
+        added, duplicates, invalid = await db_exec(_insert_profiles, lines)
+        invalidate_admin_views()
+        
+        message = f"✅ Added {added} profiles!"
+        if duplicates:
+            message += f"\n♻️ Skipped {duplicates} duplicate(s) already in stock."
+        if invalid:
+            message += f"\n⚠️ Skipped {invalid} line(s) not in email:password:pin format."
+        await update.message.reply_text(message)
         return ConversationHandler.END
 
 
+# Buttons handled outside the conversations, keyed by exact callback data
+CALLBACK_ROUTES = {
+    'choose_free': NetflixBot.choose_free_path,
+    'verify_and_get_link': NetflixBot.verify_and_get_link,
+    'back_to_start': NetflixBot.back_to_start,
+    'admin_pending': AdminPanel.admin_pending_payments,
+    'admin_stats': AdminPanel.admin_stats,
+    'admin_stock': AdminPanel.admin_stock,
+    'admin_list': AdminPanel.admin_list,
+    'admin_referrals': AdminPanel.admin_referrals,
+    'back_to_admin': AdminPanel.back_to_admin,
+}
+
+# Buttons that carry a payment id (and reason), keyed by the action in PAYMENT_CALLBACK_PATTERN
+PAYMENT_CALLBACK_ROUTES = {
+    'approve_payment': AdminPanel.approve_payment,
+    'reject_payment': AdminPanel.reject_payment,
+    'reject_reason': AdminPanel.reject_with_reason,
+}
+
+
+def find_callback_route(data):
+    """Resolve callback data to its handler, or None if it isn't routed here"""
+    if not isinstance(data, str):
+        return None
+    handler = CALLBACK_ROUTES.get(data)
+    if handler:
+        return handler
+    match = PAYMENT_CALLBACK_PATTERN.fullmatch(data)
+    return PAYMENT_CALLBACK_ROUTES[match[1]] if match else None
+
+
+async def dispatch_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Route a button tap to its handler"""
+    handler = find_callback_route(update.callback_query.data)
+    if handler:
+        await handler(update, context)
+
+
 def main():
     """Start the bot"""
     if not BOT_TOKEN:
         logger.error("BOT_TOKEN not set!")
         return
     
+    # Faster event loop when available; PTB runs on whatever loop policy is installed
+    if uvloop:
+        uvloop.install()
+    
     init_database()
     
-    application = Application.builder().token(BOT_TOKEN).build()
+    global DB_POOL, OCR_POOL
+    DB_POOL = SQLiteConnectionPool(DATABASE_PATH)
+    OCR_POOL = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+    
+    # Long polling only needs one connection; the rest stay free for outgoing calls,
+    # which HTTP/2 multiplexes over a few TCP/TLS connections during broadcasts
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(FastJSONRequest(
+            connection_pool_size=HTTP_POOL_SIZE,
+            pool_timeout=HTTP_POOL_TIMEOUT,
+            connect_timeout=10,
+            read_timeout=30,
+            http_version='2',
+        ))
+        .get_updates_request(FastJSONRequest(connection_pool_size=1, pool_timeout=30))
+        .build()
+    )
     
     # Load admins
     async def post_init(app: Application):
         await load_admins_from_env()
+        await warm_user_caches()
+        await resolve_channel_id(app)
+        WRITER_TASKS.extend([run_in_background(payment_writer()), run_in_background(flag_writer())])
+    
+    async def post_shutdown(app: Application):
+        # Commit queued payments and flags before the connections go away
+        await stop_writers()
+        DB_POOL.close()
+        OCR_POOL.shutdown(wait=False, cancel_futures=True)
     
     application.post_init = post_init
+    application.post_shutdown = post_shutdown
     
-    # Handlers
+    # Handlers; conversation state stays keyed by (chat, user) so an admin's replies in the
+    # admin log group can never land in a broadcast or bulk upload started in private
     buy_conv = ConversationHandler(
         entry_points=[CallbackQueryHandler(NetflixBot.choose_paid_path, pattern='^choose_paid$')],
         states={WAITING_PAYMENT_SCREENSHOT: [MessageHandler(filters.PHOTO, NetflixBot.handle_payment_screenshot)]},
@@ -1428,7 +2253,7 @@ def main():
     )
     
     admin_add_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(AdminPanel.admin_button_handler, pattern='^admin_add_profiles$')],
+        entry_points=[CallbackQueryHandler(AdminPanel.admin_add_profiles, pattern='^admin_add_profiles$')],
         states={WAITING_BULK_PROFILES: [MessageHandler(filters.TEXT & ~filters.COMMAND, AdminPanel.receive_bulk_profiles)]},
         fallbacks=[CommandHandler('cancel', NetflixBot.cancel)],
         allow_reentry=True
@@ -1466,19 +2291,23 @@ def main():
     application.add_handler(message_conv)
     application.add_handler(appeal_conv)
     
-    application.add_handler(CallbackQueryHandler(NetflixBot.choose_free_path, pattern='^choose_free$'))
-    application.add_handler(CallbackQueryHandler(NetflixBot.verify_and_get_link, pattern='^verify_and_get_link$'))
-    application.add_handler(CallbackQueryHandler(NetflixBot.back_to_start, pattern='^back_to_start$'))
-    application.add_handler(CallbackQueryHandler(AdminPanel.approve_payment, pattern='^approve_payment_'))
-    application.add_handler(CallbackQueryHandler(AdminPanel.reject_payment, pattern='^reject_payment_'))
-    application.add_handler(CallbackQueryHandler(AdminPanel.reject_with_reason, pattern='^reject_reason_'))
-    application.add_handler(CallbackQueryHandler(AdminPanel.admin_button_handler, pattern='^admin_'))
-    application.add_handler(CallbackQueryHandler(AdminPanel.admin_button_handler, pattern='^back_to_admin$'))
+    # Everything outside the conversations goes through one table lookup
+    application.add_handler(CallbackQueryHandler(dispatch_callback, pattern=find_callback_route))
     
     logger.info("🚀 Bot started!")
     logger.info(f"📢 Channel: {CHANNEL_LINK}")
-    logger.info(f"👥 Admins: {len(ADMIN_LIST)}")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    logger.info(f"👥 Admins: {len(ADMIN_SET)}")
+    if WEBHOOK_URL:
+        application.run_webhook(
+            listen='0.0.0.0',
+            port=PORT,
+            url_path='telegram',
+            webhook_url=f"{WEBHOOK_URL}/telegram",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == '__main__':
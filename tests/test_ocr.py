@@ -0,0 +1,40 @@
+"""OCR field extraction from payment screenshot text"""
+
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import main
+
+
+def extract(text):
+    """Run extract_transaction_info as if Tesseract had read `text`"""
+    with mock.patch.object(main.pytesseract, 'image_to_string', return_value=text):
+        return main.NetflixBot.extract_transaction_info(Image.new('L', (4, 4)))
+
+
+class ExtractTransactionInfoTest(unittest.TestCase):
+
+    def test_labelled_fields(self):
+        self.assertEqual(extract("TrxID: 9XY8ZW7VU6\nAmount: 50.00"), ('9XY8ZW7VU6', 50))
+
+    def test_amount_label_does_not_swallow_trx_id(self):
+        self.assertEqual(extract("BDT 9XY8ZW7VU6"), ('9XY8ZW7VU6', 9))
+
+    def test_first_valid_bare_trx_id_wins(self):
+        self.assertEqual(extract("45 Total hello ৳ 9XY8ZW7VU6 ABCDE12345"), ('9XY8ZW7VU6', 9))
+
+    def test_digits_only_id_when_first_bare_token_is_too(self):
+        self.assertEqual(extract("TRX 1234567890 ABCDE12345"), ('1234567890', None))
+
+    def test_product_price_preferred(self):
+        self.assertEqual(extract("Total 45 paid 50 Tk"), (None, main.PRODUCT_PRICE))
+
+    def test_last_matching_amount_rule_without_price(self):
+        # Labelled 45, then suffixed 30: like the original loop, the later rule wins
+        self.assertEqual(extract("Total 45 ... 30 Taka"), (None, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()